@@ -0,0 +1,76 @@
+import sys
+import threading
+import types
+
+from pysmt.environment import Environment, get_env, push_env, pop_env
+
+# (owner, attribute name, factory) for every piece of per-analysis state. Owners are modules or
+# classes; each module registers its own state when it is imported
+_state = []
+
+
+def register_state(owner, names, factory=None):
+    '''
+    Declare owner.name as per-analysis state. A context starts it from factory(),
+    by default an empty instance of the current value's type.
+    '''
+    for name in names:
+        make = factory if factory is not None else type(getattr(owner, name))
+        _state.append((owner, name, make))
+
+
+def _bind(owner, name, value):
+    current = getattr(owner, name)
+    setattr(owner, name, value)
+    if isinstance(owner, types.ModuleType) and not isinstance(current, (type(None), bool, int, str)):
+        # `from module import *` copies the binding, so rebind the aliases of shared containers as well
+        for module in list(sys.modules.values()):
+            namespace = getattr(module, "__dict__", None)
+            if namespace is not None and namespace.get(name, None) is current:
+                namespace[name] = value
+    return current
+
+
+class AnalysisContext():
+    '''
+    An isolated copy of the encoder's global state (quantifier bookkeeping, memo tables,
+    bound tracking, parsed scalar masks...) together with its own pysmt environment, so that
+    specifications declaring the same action names do not clash. Code run inside `with context:`
+    reads and writes the context's state only, so several specifications can be parsed and checked
+    in one process, one after another or interleaved, without clear_all between them; dropping the
+    context disposes of its state.
+
+    This is isolation, not concurrency: the state is swapped into the module and class globals and
+    pysmt keeps its current environment in a process wide stack, so a context is held by one thread
+    from __enter__ to __exit__ and a thread entering another context waits until it is left.
+    Checks are run in parallel in worker processes (--jobs, --portfolio).
+    '''
+    # makes entering exclusive across threads, reentrant within one
+    _lock = threading.RLock()
+
+    def __init__(self):
+        self.values = [make() for _, _, make in _state]
+        self.env = Environment()
+        # pysmt.shortcuts turns infix notation on for the default environment only
+        self.env.enable_infix_notation = get_env().enable_infix_notation
+        self.saved = None
+        self.depth = 0
+
+    def __enter__(self):
+        AnalysisContext._lock.acquire()
+        self.depth += 1
+        if self.depth == 1:
+            # state registered after the context was created (a module imported later) starts fresh
+            self.values += [make() for _, _, make in _state[len(self.values):]]
+            self.saved = [_bind(owner, name, value) for (owner, name, _), value in zip(_state, self.values)]
+            push_env(self.env)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.depth -= 1
+        if self.depth == 0:
+            pop_env()
+            self.values = [_bind(owner, name, value) for (owner, name, _), value in zip(_state, self.saved)]
+            self.saved = None
+        AnalysisContext._lock.release()
+        return False
@@ -2,7 +2,17 @@ from logic_operator import *
 from type_constructor import snap_shot
 from trace_ult import print_trace
 import copy
+import os
+import resource
+import sys
+import threading
+import time
+import weakref
+from pysmt.exceptions import SolverReturnedUnknownResultError
 from derivation_rule import Proof_Writer
+from phase_profiler import NO_PROFILER
+from z3_backend import new_solver, SOLVER_BACKENDS
+from analysis_context import AnalysisContext, register_state
 
 '''
 Check the validity of a trace implied by the model from
@@ -10,6 +20,15 @@ solving a given set of constraints. Stop at the
 first rule that is violated by the trace 
 '''
 action_iteration_bound = 1000
+# backend of the solvers of check_property_refining and check_trace (see z3_backend);
+# checks recording a proof stay on pysmt
+solver_backend = "pysmt"
+
+
+def set_solver_backend(name):
+    global solver_backend
+    assert name in SOLVER_BACKENDS
+    solver_backend = name
 
 
 def get_all_actions(ACTION):
@@ -94,6 +113,7 @@ def clear_rules(rules):
 
 considered_object = OrderedSet()
 considered_constraint = []
+register_state(sys.modules[__name__], ["considered_object", "considered_constraint"])
 
 
 def get_all_constraint(ACTION, full=True):
@@ -153,19 +173,98 @@ def action_changed(ACTION):
     return changed
 
 
-def check_trace(model, complete_rules, rules, stop_at_first=True, axioms=None):
-    solver = Solver(name="z3", random_seed=43)
-    if axioms:
-        solver.add_assertion(axioms)
-    # assert(len(Forall.pending_defs) == 0)
-    parital_model = [EqualsOrIff(k, v) for k, v in model]
-    solver.add_assertion(And(parital_model))
+# (action class, attribute) pairs watched by each rule, they only depend on the rule formula and are
+# kept across checks, for as long as the rule lives
+watch_index = weakref.WeakKeyDictionary()
+
+
+class TraceWatch():
+    '''
+    Remembers the values of the watched (action class, attribute) pairs under which each rule last held
+    in one check, so that check_trace only revisits the rules whose watched classes gained instances or
+    changed values since
+    '''
+
+    def __init__(self):
+        self.held = {}
+        self.values = {}
+        self.signatures = {}
+
+    def watched(self, rule):
+        if rule not in watch_index:
+            watched = watched_attributes(rule)
+            watch_index[rule] = list(watched) if watched is not None else None
+        return watch_index[rule]
+
+    def new_round(self, values):
+        self.values = values
+        self.signatures = {}
+
+    def signature(self, rule):
+        watched = self.watched(rule)
+        if watched is None:
+            return None
+        res = []
+        memo = {}
+        for act_type, attr in watched:
+            key = (act_type, attr)
+            if key not in self.signatures:
+                # absent actions neither instantiate a forall nor witness an exists, their values do not matter
+                signature = [len(act_type.snap_shot)]
+                for act in act_type.collect_list:
+                    presence = model_evaluate(act.presence, self.values, memo)
+                    signature.append(model_evaluate(getattr(act, attr), self.values, memo)
+                                     if presence is not False else False)
+                self.signatures[key] = tuple(signature)
+            res.append(self.signatures[key])
+        return tuple(res)
+
+    def unchanged(self, rule):
+        held = self.held.get(rule, None)
+        return held is not None and held == self.signature(rule)
+
+    def hold(self, rule):
+        signature = self.signature(rule)
+        if signature is not None:
+            self.held[rule] = signature
+
+
+def check_trace(model, complete_rules, rules, stop_at_first=True, axioms=None, watch=None):
+    # rules are first evaluated on the concrete model, only the ones the model cannot decide
+    # (new witnesses, unassigned symbols) are checked by solving under the model.
+    # With a watch, the rules that held on the same watched values in an earlier round are skipped
+    values = model_values(model)
+    if watch is not None:
+        watch.new_round(values)
+    solver = None
     result = OrderedSet()
     called = False
     for rule in complete_rules:
         if rule in rules:
             continue
         else:
+            if watch is not None and watch.unchanged(rule):
+                continue
+            holds = model_evaluate(rule, values)
+            Exists.check_ACTS.clear()
+            if holds is not None:
+                if holds and watch is not None:
+                    watch.hold(rule)
+                if not holds:
+                    result.add(rule)
+                    if stop_at_first:
+                        return result, None
+                continue
+            if solver is None:
+                solver = new_solver(solver_backend, random_seed=43)
+                if axioms:
+                    solver.add_assertion(axioms)
+                # assert(len(Forall.pending_defs) == 0)
+                if solver_backend == "native":
+                    solver.add_model(model)
+                else:
+                    parital_model = [EqualsOrIff(k, v) for k, v in model]
+                    solver.add_assertion(And(parital_model))
             # solver.push()
             constraint = encode(rule, include_new_act=False, disable=True)
             solver.add_assertion(constraint)
@@ -269,22 +368,203 @@ def prove_by_induction(property, rules, complete_rules, ACTION, state_action, mi
 import random
 
 
-def check_property_refining(property, rules, complete_rules, ACTION, state_action, minimized=True, vol_bound=500,
+class IncrementalSession():
+    '''
+    Solver state shared by a sequence of check_property_refining calls over one rule set.
+    Every guarded rule is asserted at most once as (guard -> rule); a check enables the
+    rules it needs by assuming their guards, so instantiated actions and learned clauses
+    carry over from one check to the next instead of being re-encoded from scratch.
+    '''
+
+    def __init__(self, guarded_rules):
+        self.guards = dict()
+        for rule in guarded_rules:
+            self.guards[rule] = FreshSymbol(template="RULE_GUARD%d")
+        self.solver = new_solver(solver_backend, unsat_cores_mode=None, random_seed=43)
+        self.maxsat = new_maxsat_engine()
+        self.encoded = OrderedSet()
+
+    def guard(self, rule, constraint):
+        lit = self.guards.get(rule, None)
+        if lit is None:
+            return constraint
+        return Implies(lit, constraint)
+
+    def active_guards(self, complete_rules):
+        return OrderedSet([self.guards[r] for r in complete_rules if r in self.guards])
+
+
+# strategy knobs overriding the arguments of every check_property_refining call (restart, boundary_case,
+# universal_blocking, min_solution, disable_minimization, random_seed, and engine: "fol" to answer the call with
+# check_property_quantified instead), and a test polled once per round that abandons the check by raising
+# RefiningCancelled; the portfolio runner sets both in its workers
+refining_strategy = dict()
+refining_cancelled = None
+
+
+class RefiningCancelled(Exception):
+    pass
+
+
+def set_refining_strategy(strategy=None, cancelled=None):
+    global refining_strategy, refining_cancelled
+    refining_strategy = dict(strategy) if strategy else dict()
+    refining_cancelled = cancelled
+
+
+def resident_memory():
+    # MB resident right now (the peak where /proc is not available)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Budget():
+    '''
+    Limits on one check_property_refining query, or on a whole analysis: wall clock seconds, seconds spent in
+    the round's main solve, resident memory in MB and CEGAR rounds; None leaves a resource unbounded.
+    start() gives the running copy a query is checked against; started from an analysis budget, a query is
+    held to what is left of both, and what it uses is charged to both.
+    '''
+
+    def __init__(self, wall_time=None, solver_time=None, memory=None, rounds=None):
+        self.wall_time = wall_time
+        self.solver_time = solver_time
+        self.memory = memory
+        self.rounds = rounds
+        self.parent = None
+        self.started_at = time.time()
+        self.solver_seconds = 0.0
+        self.rounds_done = 0
+
+    def start(self, parent=None):
+        running = Budget(self.wall_time, self.solver_time, self.memory, self.rounds)
+        running.parent = parent
+        return running
+
+    def charge(self, solver_seconds=0.0, rounds=0):
+        budget = self
+        while budget is not None:
+            budget.solver_seconds += solver_seconds
+            budget.rounds_done += rounds
+            budget = budget.parent
+
+    def exceeded(self):
+        # the first limit used up, here or in the budget this one was started from
+        if self.wall_time is not None and time.time() - self.started_at >= self.wall_time:
+            return "wall time"
+        if self.solver_time is not None and self.solver_seconds >= self.solver_time:
+            return "solver time"
+        if self.rounds is not None and self.rounds_done >= self.rounds:
+            return "rounds"
+        if self.memory is not None and resident_memory() >= self.memory:
+            return "memory"
+        if self.parent is not None:
+            return self.parent.exceeded()
+        return None
+
+    def solver_limits(self):
+        # z3 limits for the solver calls of the next round: milliseconds left of the wall and solver time,
+        # and the memory in MB (None when unbounded)
+        left = []
+        if self.wall_time is not None:
+            left.append(self.wall_time - (time.time() - self.started_at))
+        if self.solver_time is not None:
+            left.append(self.solver_time - self.solver_seconds)
+        timeout = int(max(min(left), 0.001) * 1000) if left else None
+        memory = self.memory
+        if self.parent is not None:
+            parent_timeout, parent_memory = self.parent.solver_limits()
+            timeout = min([t for t in [timeout, parent_timeout] if t is not None], default=None)
+            memory = min([m for m in [memory, parent_memory] if m is not None], default=None)
+        return timeout, memory
+
+    def stats(self):
+        return {"seconds": round(time.time() - self.started_at, 3), "solver_seconds": round(self.solver_seconds, 3),
+                "rounds": self.rounds_done, "memory": round(resident_memory(), 1)}
+
+
+class BudgetExceeded():
+    '''
+    What check_property_refining returns for a query that ran out of its budget (neither a trace nor UNSAT):
+    the limit that was reached and how far the query got
+    '''
+    # how many were handed out in this process, so callers can tell whether one of their queries ran out
+    issued = 0
+
+    def __init__(self, reason, stats):
+        self.reason = reason
+        self.stats = stats
+        BudgetExceeded.issued += 1
+
+    def __str__(self):
+        return "Unknown (budget exceeded: {}, {} rounds, {:.2f}s)".format(self.reason, self.stats["rounds"],
+                                                                        self.stats["seconds"])
+
+
+def start_budget(query=None, analysis=None):
+    # the running budget of one query: its own limits, started under the running analysis budget if any
+    if query is not None:
+        return query.start(analysis)
+    return analysis
+
+
+# z3's "no limit" for the per solver timeout and max_memory
+Z3_UNLIMITED = 4294967295
+
+
+def check_property_refining(property, rules, complete_rules, ACTION, state_action, *args, budget=None, **kwargs):
+    '''
+    check_property_refining_unbounded held to a budget (see Budget): the limits are checked before every round
+    and handed to z3 for the round's solver calls, and a query that reaches one returns BudgetExceeded
+    '''
+    if refining_strategy.get("engine") == "fol" and not kwargs.get("record_proof"):
+        # the axioms the loop would deepen into are part of the quantified query from the start
+        axioms = list(dict.fromkeys(a for _, stage in kwargs.get("deepening") or [] for a in stage))
+        return check_property_quantified(property, list(complete_rules) + axioms, ACTION, budget=budget)
+    if budget is None:
+        return check_property_refining_unbounded(property, rules, complete_rules, ACTION, state_action, *args,
+                                                 **kwargs)
+    session = kwargs.get("session")
+    try:
+        return check_property_refining_unbounded(property, rules, complete_rules, ACTION, state_action, *args,
+                                                 budget=budget, **kwargs)
+    except SolverReturnedUnknownResultError:
+        return BudgetExceeded(budget.exceeded() or "solver limit", budget.stats())
+    finally:
+        if session is not None:
+            session.solver.z3.set("timeout", Z3_UNLIMITED)
+            session.solver.z3.set("max_memory", Z3_UNLIMITED)
+
+
+def check_property_refining_unbounded(property, rules, complete_rules, ACTION, state_action, minimized=True, vol_bound=500,
                             disable_minimization=False, min_solution=False, final_min_solution=False,
                             boundary_case=False, universal_blocking=False, restart=False, ignore_state_action=False,
                             axioms=None, record_proof=False, ret_model=False, scalar_mask=None, unsat_mode=False, print_z3="",
-                            assumptions =None):
+                            assumptions =None, session=None, profiler=None, budget=None, deepening=None):
+    restart = refining_strategy.get("restart", restart)
+    boundary_case = refining_strategy.get("boundary_case", boundary_case)
+    universal_blocking = refining_strategy.get("universal_blocking", universal_blocking)
+    min_solution = refining_strategy.get("min_solution", min_solution)
+    disable_minimization = refining_strategy.get("disable_minimization", disable_minimization)
     print("solving under config: restart {}, bcr {}, ub {}, min {}".format(restart, boundary_case, universal_blocking,
                                                                            min_solution))
 
     rules = OrderedSet(rules)
+    # (vol_bound, axioms) stages to move on to, in order, instead of giving up with bounded UNSAT: the live check
+    # raises its bound and takes the axioms as rules, keeping the instantiated actions and what the solver learned
+    deepening = list(deepening) if deepening else []
     current_min_solution = False
     out_of_bound_warning = False
     application_rounds = 1
     opt_sol_check = False
+    if profiler is None:
+        profiler = NO_PROFILER
 
     if record_proof:
-        proof_writer = Proof_Writer("proof.txt")
+        proof_writer = profiler.wrap(Proof_Writer("proof.txt"), "proof")
         proof_writer.add_input_rule(property)
         for rule in complete_rules:
             proof_writer.add_input_rule(rule)
@@ -305,7 +585,23 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
 
     new_rules = set(rules)
     should_calibrate = True
-    s = Solver("z3", unsat_cores_mode=None, random_seed=43)
+    watch = TraceWatch()
+    if session is None:
+        s = new_solver("pysmt" if record_proof else solver_backend, unsat_cores_mode=None,
+                       random_seed=refining_strategy.get("random_seed", 43))
+        engine = new_maxsat_engine()
+        scope = None
+        guards = OrderedSet()
+    else:
+        # facts learned under this check's assumptions are only valid for this check, so
+        # they are guarded by a fresh scope literal that later checks never assume
+        s = session.solver
+        engine = session.maxsat
+        scope = FreshSymbol(template="SCOPE%d")
+        guards = session.active_guards(complete_rules)
+        guards.add(scope)
+        rules = rules.union([r for r in session.encoded if r in complete_rules])
+        history.clear()
     if axioms:
         s.add_assertion(axioms)
 
@@ -315,7 +611,11 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
         assumptions = set(assumptions)
 
 
-    prop = encode(property, include_new_act=True, proof_writer=proof_writer, unsat_mode=unsat_mode)
+    profiler.round = application_rounds
+    with profiler.phase("encode"):
+        prop = encode(property, include_new_act=True, proof_writer=proof_writer, unsat_mode=unsat_mode)
+    if scope is not None:
+        prop = Implies(scope, prop)
     s.add_assertion(prop)
     # print(serialize(prop))
     # restart control
@@ -326,6 +626,18 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
 
     while application_rounds < action_iteration_bound:
         # print(application_rounds)
+        profiler.round = application_rounds
+        if refining_cancelled is not None and refining_cancelled():
+            raise RefiningCancelled()
+        if budget is not None:
+            reason = budget.exceeded()
+            if reason is not None:
+                print("budget exceeded: {}".format(reason))
+                return BudgetExceeded(reason, budget.stats())
+            timeout, memory = budget.solver_limits()
+            s.z3.set("timeout", Z3_UNLIMITED if timeout is None else timeout)
+            s.z3.set("max_memory", Z3_UNLIMITED if memory is None else int(memory))
+            budget.charge(rounds=1)
 
         # reset_underapprox(s)
         # handle restart
@@ -340,19 +652,23 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
             round_without_new_rules = 0
             restart_threshold = int(restart_threshold * 1.5)
 
-        while (action_changed(ACTION) or should_calibrate):
-            should_calibrate = False
-            snap_shot_all(ACTION)
-            encode(property, include_new_act=False, proof_writer=proof_writer, unsat_mode=unsat_mode)
-            for p in rules:
-                if p in new_rules:
-                    # if record_proof:
-                    #     proof_writer.add_input_rule(p)
-                    temp_res = encode(p, include_new_act=False, proof_writer=proof_writer, unsat_mode=unsat_mode)
-                    s.add_assertion(temp_res)
-                    # print(serialize(temp_res))
-                else:
-                    encode(p, include_new_act=False, proof_writer=proof_writer, unsat_mode=unsat_mode)
+        with profiler.phase("encode"):
+            while (action_changed(ACTION) or should_calibrate):
+                should_calibrate = False
+                snap_shot_all(ACTION)
+                encode(property, include_new_act=False, proof_writer=proof_writer, unsat_mode=unsat_mode)
+                for p in rules:
+                    if p in new_rules:
+                        # if record_proof:
+                        #     proof_writer.add_input_rule(p)
+                        temp_res = encode(p, include_new_act=False, proof_writer=proof_writer, unsat_mode=unsat_mode)
+                        if session is not None:
+                            temp_res = session.guard(p, temp_res)
+                            session.encoded.add(p)
+                        s.add_assertion(temp_res)
+                        # print(serialize(temp_res))
+                    else:
+                        encode(p, include_new_act=False, proof_writer=proof_writer, unsat_mode=unsat_mode)
 
         # for ACt in ACTION:
         #     print(ACt)
@@ -365,37 +681,41 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
         # print("end encoding")
 
         # now update the constraints
-        update_underapprox(s)
-        over_constraints, over_vars = update_overapprox()
-        over_vars = over_vars.union(assumptions)
-        for c in over_constraints:
-            if c != TRUE():
-                s.add_assertion(c)
+        with profiler.phase("approx"):
+            update_underapprox(s)
+            over_constraints, over_vars = update_overapprox()
+            over_vars = over_vars.union(assumptions).union(guards)
+            for c in over_constraints:
+                if c != TRUE():
+                    s.add_assertion(c)
 
-        add_forall_defs(s)
-        add_exist_defs(s)
-        add_predicate_constraint(s)
-        all_cons = And(get_all_constraint(ACTION, full=False))
-        s.add_assertion(all_cons)
+        with profiler.phase("encode"):
+            add_forall_defs(s)
+            add_exist_defs(s)
+            add_predicate_constraint(s)
+            all_cons = And(get_all_constraint(ACTION, full=False))
+            s.add_assertion(all_cons)
         # print(serialize(all_cons))
 
         if current_min_solution:
             solved = True
         else:
             # solved = s.solve(over_vars.union(eq_assumption))
-            solved = solver_under_eq_assumption(s, over_vars, eq_assumption)
+            with profiler.phase("solve", domain=sum(len(ACT.collect_list) for ACT in ACTION)):
+                solved = solver_under_eq_assumption(s, over_vars, eq_assumption)
 
         if solved:
             save_model = s.get_model()
             # Summation.frontier = new_frontier
             # Summation.collections = new_summation
 
-            constraints, vars = get_temp_act_constraints()
+            with profiler.phase("approx"):
+                constraints, vars = get_temp_act_constraints()
 
-            for c in constraints:
-                if c != TRUE():
-                    s.add_assertion(c)
-                    # print("add temp constraint {}".format(serialize(c)))
+                for c in constraints:
+                    if c != TRUE():
+                        s.add_assertion(c)
+                        # print("add temp constraint {}".format(serialize(c)))
             # s.add_assertion(And(constraints))
             vars = vars.union(over_vars)
 
@@ -403,17 +723,23 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
                 solved = True
             else:
                 # solved = s.solve(vars)
-                solved = solver_under_eq_assumption(s, vars, eq_assumption)
+                with profiler.phase("solve", domain=sum(len(ACT.collect_list) for ACT in ACTION)):
+                    solve_start = time.time()
+                    solved = solver_under_eq_assumption(s, vars, eq_assumption)
+                    if budget is not None:
+                        budget.charge(solver_seconds=time.time() - solve_start)
 
             if solved:
                 model = s.get_model()
                 # print_trace(model, ACTION, state_action, ignore_class=state_action)
                 # check trace
-                res, model = check_trace(model, complete_rules, rules, stop_at_first=True)
+                with profiler.phase("check_trace"):
+                    res, model = check_trace(model, complete_rules, rules, stop_at_first=True, watch=watch)
                 if len(res) == 0:
                     if min_solution:
-                        model = mini_solve(s, get_all_actions(ACTION), vars=vars, eq_vars=eq_assumption,
-                                           ignore_class=ignore_actions)
+                        with profiler.phase("minimize"):
+                            model = mini_solve(s, get_all_actions(ACTION), vars=vars, eq_vars=eq_assumption,
+                                               ignore_class=ignore_actions, engine=engine)
                         # print("mini-trace")
                     print("find trace")
                     current_best = model
@@ -421,17 +747,26 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
 
                     if min_solution or (out_of_bound_warning and vol > vol_bound):
                         # s.pop()
-                        model = get_temp_act_constraint_minimize(s, rules, over_vars, eq_assumption,
-                                                                 addition_actions=get_all_actions(ACTION),
-                                                                 round=application_rounds,
-                                                                 disable_minimization=disable_minimization,
-                                                                 ignore_class=ignore_actions, relax_mode=False)
+                        with profiler.phase("minimize"):
+                            model = get_temp_act_constraint_minimize(s, rules, over_vars, eq_assumption,
+                                                                     addition_actions=get_all_actions(ACTION),
+                                                                     round=application_rounds,
+                                                                     disable_minimization=disable_minimization,
+                                                                     ignore_class=ignore_actions, relax_mode=False,
+                                                                     engine=engine)
                         new_vol, _ = print_trace(model, ACTION, state_action, should_print=False,
                                                  ignore_class=state_action, check_sum=True)
                         print(new_vol, vol)
                         if new_vol > vol_bound:
                             print("Bounded UNSAT")
-                            return 2
+                            if not deepening:
+                                return 2
+                            vol_bound, extra = deepening.pop(0)
+                            rules, complete_rules, new_rules = deepen(vol_bound, extra, rules, complete_rules,
+                                                                      proof_writer)
+                            out_of_bound_warning = current_min_solution = opt_sol_check = False
+                            should_calibrate = True
+                            continue
                         if new_vol >= vol:
                             if not opt_sol_check:
                                 opt_sol_check = True
@@ -475,13 +810,15 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
                     else:
                         addition_actions = None
 
-                    new_model = get_temp_act_constraint_minimize(s, complete_rules, over_vars, eq_assumption,
-                                                                 addition_actions=addition_actions,
-                                                                 round=application_rounds,
-                                                                 disable_minimization=disable_minimization,
-                                                                 ignore_class=ignore_actions,
-                                                                 inductive_assumption_table=inductive_assumption_table,
-                                                                 relax_mode=False, ub=universal_blocking, over_model=save_model)
+                    with profiler.phase("minimize"):
+                        new_model = get_temp_act_constraint_minimize(s, complete_rules, over_vars, eq_assumption,
+                                                                     addition_actions=addition_actions,
+                                                                     round=application_rounds,
+                                                                     disable_minimization=disable_minimization,
+                                                                     ignore_class=ignore_actions,
+                                                                     inductive_assumption_table=inductive_assumption_table,
+                                                                     relax_mode=False, ub=universal_blocking,
+                                                                     over_model=save_model, engine=engine)
 
                     if new_model is None:
                         new_volume, _ = print_trace(save_model, ACTION, state_action, should_print=False,
@@ -494,19 +831,27 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
                     # print_trace(new_model, ACTION, state_action, should_print=True, ignore_class=[], solver=s,
                     #             assumption=over_vars)
                     # print("start cleanning")
-                    summation_clean_up(s, over_vars)
-                    for ACT in ACTION:
-                        clean_up_action(s, over_vars, ACT)
+                    with profiler.phase("cleanup"):
+                        summation_clean_up(s, over_vars, scope=scope)
+                        for ACT in ACTION:
+                            clean_up_action(s, over_vars, ACT, scope=scope)
                     # print("start action merging ")
                     # print("{} assumptions remained".format(len(eq_assumption)))
                     if new_model:
-                        model_based_gc(ACTION, new_model, s, eq_assumption, over_vars, strengthen=False,
-                                       value_bound_assumption=False)
+                        with profiler.phase("model_based_gc"):
+                            model_based_gc(ACTION, new_model, s, eq_assumption, over_vars, strengthen=False,
+                                           value_bound_assumption=False, scope=scope)
                     # print("{} assumptions generated".format(len(eq_assumption)))
                     if new_volume > vol_bound:
                         if out_of_bound_warning:
                             print("bounded UNSAT")
-                            return 2
+                            if not deepening:
+                                return 2
+                            vol_bound, extra = deepening.pop(0)
+                            rules, complete_rules, new_rules = deepen(vol_bound, extra, rules, complete_rules,
+                                                                      proof_writer)
+                            out_of_bound_warning = current_min_solution = opt_sol_check = False
+                            should_calibrate = True
                         else:
                             # print("entering strict min search mode")
                             out_of_bound_warning = True
@@ -555,6 +900,16 @@ def check_property_refining(property, rules, complete_rules, ACTION, state_actio
     return -1
 
 
+def deepen(vol_bound, axioms, rules, complete_rules, proof_writer=None):
+    # the rules, complete rules and rules to encode of a check moving on to vol_bound with the extra axioms
+    print("deepening to vol bound {}".format(vol_bound))
+    axioms = [a for a in axioms if a not in complete_rules]
+    if proof_writer is not None:
+        for a in axioms:
+            proof_writer.add_input_rule(a)
+    return rules.union(axioms), list(complete_rules) + axioms, set(axioms)
+
+
 def solver_under_eq_assumption(solver, assumption, eq_assumption):
     satisfying = solver.solve(assumption.union(eq_assumption))
     while not satisfying:
@@ -610,6 +965,59 @@ def check_property_fol(property, rules, ACTION):
     else:
         print(satisfying)
 
+def check_property_quantified(property, rules, ACTION, budget=None):
+    '''
+    the check on the quantified encoding (fol_encode) left to z3's own quantifier instantiation: 0 when UNSAT,
+    a str when SAT (no trace is read from a model of the quantified encoding), BudgetExceeded when z3 gives up
+    or the budget runs out. refining_cancelled is polled while z3 runs and interrupts it
+    '''
+    s = Solver("z3", unsat_cores_mode=None, random_seed=refining_strategy.get("random_seed", 43))
+    s.add_assertion(fol_encode(property))
+    for r in rules:
+        s.add_assertion(fol_encode(r))
+    for Act in ACTION:
+        s.add_assertion(get_fol_invaraint(Act))
+
+    if budget is None:
+        budget = Budget()
+    reason = budget.exceeded()
+    if reason is not None:
+        return BudgetExceeded(reason, budget.stats())
+    timeout, memory = budget.solver_limits()
+    if timeout is not None:
+        s.z3.set("timeout", timeout)
+    if memory is not None:
+        s.z3.set("max_memory", int(memory))
+
+    done = threading.Event()
+    cancelled = []
+
+    def watch():
+        while not done.wait(0.05):
+            if refining_cancelled():
+                cancelled.append(True)
+                s.z3.ctx.interrupt()
+                return
+
+    if refining_cancelled is not None:
+        threading.Thread(target=watch, daemon=True).start()
+    start = time.time()
+    try:
+        satisfying = s.solve()
+    except SolverReturnedUnknownResultError:
+        satisfying = None
+    finally:
+        done.set()
+        budget.charge(solver_seconds=time.time() - start, rounds=1)
+    if cancelled:
+        raise RefiningCancelled()
+    if satisfying is None:
+        return BudgetExceeded(budget.exceeded() or "quantified solver gave up", budget.stats())
+    if satisfying:
+        return "SAT (quantified encoding, no trace)\n"
+    return 0
+
+
 def solve_fol(rules, complete_rules, ACTION, state_action, minimized=False, vol_bound=500,
                             disable_minimization=False, min_solution=False, final_min_solution=False,
                             boundary_case=False, universal_blocking=False, restart=False, ignore_state_action=False,
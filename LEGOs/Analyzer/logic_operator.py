@@ -2,10 +2,19 @@ from ordered_set import OrderedSet
 from pysmt.shortcuts import *
 from pysmt.shortcuts import Exists as PExist
 from pysmt.shortcuts import ForAll as PForall
+from pysmt.fnode import FNode
+import pysmt.operators as smt_op
+import z3
 
 from type_constructor import Action, UnionAction
+from memo_cache import BoundedCache, function_cache, predicate_cache, and_cache, or_cache
+from analysis_context import register_state
+from maxsat_engine import add_def, relax_core, get_assumption_core, MAXSAT_ENGINES
+from z3_backend import NativeModel, assignment
 
 import itertools
+import operator
+import sys
 
 controll_varaible_eq = dict()
 controll_varaible_eq_r = dict()
@@ -177,6 +186,161 @@ def fol_encode(formula):
     else:
         return formula
 
+
+def model_values(model):
+    if isinstance(model, NativeModel):
+        # a copy, evaluation binds witnesses in the values
+        return dict(model.assignment())
+    z3_model = getattr(model, "z3_model", None)
+    if z3_model is None:
+        return dict((k, v.constant_value()) for k, v in model)
+    # read the z3 assignment directly, converting every value back through pysmt dominates large models
+    return assignment(z3_model)
+
+
+def model_evaluate(formula, values, memo=None):
+    '''
+    three-valued evaluation of formula (as encoded with disable=True) against the concrete values of a model:
+    True or False when the values decide it, None when it depends on an unassigned symbol
+    or on a witness that is not in the domain yet
+    '''
+    if memo is None:
+        memo = {}
+    if isinstance(formula, Operator):
+        if formula.subs:
+            return None
+        return formula.model_evaluate(values, memo)
+    elif isinstance(formula, FNode):
+        return _evaluate_term(formula, values, memo)
+    else:
+        return formula
+
+
+def _evaluate_term(term, values, memo):
+    # post-order over the pysmt DAG, without recursion as sums are chains as long as the domain
+    stack = [term]
+    while stack:
+        node = stack[-1]
+        if node in memo:
+            stack.pop()
+            continue
+        pending = [arg for arg in node.args() if arg not in memo]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        memo[node] = _apply_term(node, [memo[arg] for arg in node.args()], values)
+    return memo[term]
+
+
+def _apply_term(node, args, values):
+    kind = node.node_type()
+    if kind == smt_op.SYMBOL:
+        return values.get(node)
+    if node.is_constant():
+        return node.constant_value()
+    if kind == smt_op.AND:
+        return _kleene_and(args)
+    if kind == smt_op.OR:
+        return _kleene_or(args)
+    if kind == smt_op.NOT:
+        return None if args[0] is None else not args[0]
+    if kind == smt_op.IMPLIES:
+        return _kleene_or([None if args[0] is None else not args[0], args[1]])
+    if kind == smt_op.ITE:
+        if args[0] is None:
+            return args[1] if args[1] is not None and args[1] == args[2] else None
+        return args[1] if args[0] else args[2]
+    if any(arg is None for arg in args):
+        return None
+    if kind == smt_op.IFF or kind == smt_op.EQUALS:
+        return args[0] == args[1]
+    if kind == smt_op.LE:
+        return args[0] <= args[1]
+    if kind == smt_op.LT:
+        return args[0] < args[1]
+    if kind == smt_op.PLUS:
+        return sum(args)
+    if kind == smt_op.MINUS:
+        return args[0] - args[1]
+    if kind == smt_op.TIMES:
+        res = 1
+        for arg in args:
+            res *= arg
+        return res
+    return None
+
+
+def _kleene_and(results):
+    unknown = False
+    for res in results:
+        if res is None:
+            unknown = True
+        elif not res:
+            return False
+    return None if unknown else True
+
+
+def _kleene_or(results):
+    unknown = False
+    for res in results:
+        if res is None:
+            unknown = True
+        elif res:
+            return True
+    return None if unknown else False
+
+
+def watched_attributes(formula):
+    '''
+    the (action class, attribute) pairs whose values in a model decide model_evaluate(formula), read off the
+    print statements of its quantifiers. None if formula depends on anything else (summations, sub-actions,
+    symbols outside of the quantified actions)
+    '''
+    watched = set()
+    if _collect_watched(formula, watched, {}):
+        return watched
+    return None
+
+
+def _collect_watched(formula, watched, symbols):
+    if isinstance(formula, FNode):
+        for var in get_free_variables(formula):
+            if var not in symbols:
+                return False
+            watched.add(symbols[var])
+        return True
+    if not isinstance(formula, Operator):
+        return True
+    if formula.subs:
+        return False
+    if isinstance(formula, (Forall, Exists)):
+        if formula.input_type == _SUMObject:
+            return False
+        act_type = formula.input_type
+        watched.add((act_type, "presence"))
+        input_subs = getattr(formula, "input_subs", None) or {}
+        for key in list(act_type.index_map.keys()) + ["presence"]:
+            attr = getattr(formula.print_act, key)
+            if key in input_subs:
+                # matched against the witness candidates
+                watched.add((act_type, key))
+                if not _collect_watched(attr, watched, symbols):
+                    return False
+            elif isinstance(attr, FNode) and attr.is_symbol():
+                symbols[attr] = (act_type, key)
+        return _collect_watched(formula.get_print_statement(), watched, symbols)
+    if isinstance(formula, (C_AND, C_OR, C_Summation)):
+        return all(_collect_watched(arg, watched, symbols) for arg in formula.arg_list)
+    if isinstance(formula, C_NOT):
+        return _collect_watched(formula.arg, watched, symbols)
+    if isinstance(formula, Bool_Terminal):
+        return _collect_watched(formula.value, watched, symbols)
+    if isinstance(formula, (Arth_Expression, Compare_Binary_Expression)):
+        return _collect_watched(formula.left, watched, symbols) and \
+               _collect_watched(formula.right, watched, symbols)
+    return False
+
 def to_string(formula):
     if isinstance(formula, Operator):
         return formula.to_string()
@@ -381,6 +545,9 @@ class Operator():
     def encode(self, assumption=False, include_new_act=False, exception=None, disable=None, proof_writer=None, unsat_mode=False):
         return
 
+    def model_evaluate(self, values, memo):
+        return None
+
     def invert(self):
         return self
 
@@ -495,6 +662,12 @@ class C_NOT(Operator):
 
         return result
 
+    def model_evaluate(self, values, memo):
+        if self.polarity:
+            return model_evaluate(invert(self.arg), values, memo)
+        else:
+            return model_evaluate(self.arg, values, memo)
+
     # if invert the not, then you get the argument
     def invert(self):
         if self.op:
@@ -638,6 +811,9 @@ class Bool_Terminal(Operator):
             proof_writer.add_definition(self.value, derived=False, terminal_obj=self)
         return self.value
 
+    def model_evaluate(self, values, memo):
+        return model_evaluate(self.value, values, memo)
+
     def fol_encode(self):
         return self.value
 
@@ -674,6 +850,10 @@ class Arth_Expression(Arth_Operator):
 
         return self.operator(left_result, right_result)
 
+    def model_evaluate(self, values, memo):
+        return _apply_operator(self.operator, model_evaluate(self.left, values, memo),
+                               model_evaluate(self.right, values, memo))
+
     def fol_encode(self):
         left_result = fol_encode(self.left)
         right_result = fol_encode(self.right)
@@ -730,6 +910,13 @@ class Compare_Binary_Expression(Operator):
         else:
             return Not(self.operator(left_result, right_result))
 
+    def model_evaluate(self, values, memo):
+        res = _apply_operator(self.operator, model_evaluate(self.left, values, memo),
+                              model_evaluate(self.right, values, memo))
+        if res is None or self.polarity:
+            return res
+        return not res
+
     def fol_encode(self):
         left_result = fol_encode(self.left)
         right_result = fol_encode(self.right)
@@ -769,16 +956,16 @@ def AND(*args):
         return TRUE()
     else:
         if should_use_gate(c_args):
-            static_arg = frozenset(c_args)
-            if static_arg in C_AND.cache:
-                return C_AND.cache[static_arg]
+            gate = C_AND.cache.get(frozenset(c_args))
+            if gate is not None:
+                return gate
             return C_AND(c_args)
         else:
             return And(_polymorph_args_to_tuple(args, should_tuple=True))
 
 
 class C_AND(Operator):
-    cache = {}
+    cache = BoundedCache(and_cache)
 
     def __init__(self, *args):
         super().__init__()
@@ -804,6 +991,9 @@ class C_AND(Operator):
 
         return And(result_list)
 
+    def model_evaluate(self, values, memo):
+        return _kleene_and(model_evaluate(arg, values, memo) for arg in self.arg_list)
+
     def fol_encode(self):
         result_list = []
         for arg in self.arg_list:
@@ -861,9 +1051,9 @@ def OR(*args):
         return FALSE()
     else:
         if should_use_gate(c_args):
-            static_arg = frozenset(c_args)
-            if static_arg in C_OR.cache:
-                return C_OR.cache[static_arg]
+            gate = C_OR.cache.get(frozenset(c_args))
+            if gate is not None:
+                return gate
             else:
                 return C_OR(c_args)
         else:
@@ -876,7 +1066,7 @@ def clear(arg):
 
 
 class C_OR(Operator):
-    cache = {}
+    cache = BoundedCache(or_cache)
 
     def __init__(self, *args):
         super().__init__()
@@ -912,6 +1102,9 @@ class C_OR(Operator):
         else:
             return Or(result_list)
 
+    def model_evaluate(self, values, memo):
+        return _kleene_or(model_evaluate(arg, values, memo) for arg in self.arg_list)
+
     def invert(self):
         if self.op is None:
             arg_list = []
@@ -986,13 +1179,12 @@ def add_predicate_constraint(solver):
 class Predicate(Operator):
     Predicate_Cache = {}
 
-    def __init__(self, procedure, key_arg, size=100):
+    def __init__(self, procedure, key_arg):
         super().__init__()
         self.procedure = procedure
-        self.result_cache = dict()
+        self.result_cache = BoundedCache(predicate_cache)
         self.key_arg = key_arg
         self.predicate_constraints = []
-        self.size = size
 
     def evaulate(self, *args):
         tuple_args = _polymorph_args_to_tuple(args)
@@ -1004,9 +1196,6 @@ class Predicate(Operator):
                 self.predicate_constraints.append(
                     Implication(AND([EQ(keys[i], old_key[i]) for i in range(self.key_arg)]), EQ(cache, old_res)))
             self.result_cache[keys] = cache
-            if len(self.result_cache) > self.size:
-                self.result_cache.pop(next(iter(self.result_cache)))
-                print("clean function dict")
 
         return cache
 
@@ -1033,7 +1222,7 @@ class Function(Operator):
         self.procedure = procedure
         self.polarity = polarity
         self.evaulated = []
-        self.result_cache = dict()
+        self.result_cache = BoundedCache(function_cache, weak_keys=True)
         self.arg_num = arg_num
         self.op = None
 
@@ -1074,31 +1263,6 @@ class Function(Operator):
         return to_string(res)
 
 
-temp_count = 0
-
-
-def add_def(s, fml):
-    global temp_count
-    name = Symbol("def_{}".format(temp_count))
-    temp_count += 1
-    s.add_assertion(Iff(name, fml))
-    return name
-
-
-def relax_core(s, core, Fs):
-    prefix = TRUE()
-    Fs -= {f for f in set(core)}
-    for i in range(len(core) - 1):
-        prefix = add_def(s, And(core[i], prefix))
-        Fs |= {add_def(s, Or(prefix, core[i + 1]))}
-
-
-def get_assumption_core(solver):
-    assumptions = solver.z3.unsat_core()
-    pysmt_assumptions = [solver.converter.back(t) for t in assumptions]
-    return pysmt_assumptions
-
-
 minimize_memory = dict()
 action_activity = dict()
 
@@ -1113,8 +1277,26 @@ def update_activity(act, round):
     minimize_memory[act] = round
 
 
-def maxsat(s, Fs, round=-1, namespace=None, relax_mode=False, background=None, eq_vars=None):
-    cost = 0
+# the MaxSAT engine behind maxsat and maxsat_model (see maxsat_engine): "core" is the plain core guided loop,
+# "stratified" adds weight levels and replays the cores of earlier calls, "optimize" hands the problem to z3's Optimize
+maxsat_engine = "core"
+maxsat_timeout = None
+
+
+def set_maxsat_engine(name, timeout=None):
+    global maxsat_engine, maxsat_timeout
+    assert name in MAXSAT_ENGINES
+    maxsat_engine = name
+    maxsat_timeout = timeout
+
+
+def new_maxsat_engine():
+    # an engine for the minimization calls on one solver, kept across them so it can reuse what it learned
+    return MAXSAT_ENGINES[maxsat_engine](timeout=maxsat_timeout)
+
+
+def maxsat(s, Fs, round=-1, namespace=None, relax_mode=False, background=None, eq_vars=None, engine=None,
+           weights=None):
     Fs0 = Fs.copy()
     if not background:
         background = OrderedSet()
@@ -1122,46 +1304,29 @@ def maxsat(s, Fs, round=-1, namespace=None, relax_mode=False, background=None, e
     if not eq_vars:
         eq_vars = OrderedSet()
 
-    while not s.solve(Fs.union(background).union(eq_vars)):
-        # print("cost {}".format(cost))
-        cost += 1
-        # print("Solver start printing")
-        # for clause in s.assertions:
-        #     print(serialize(clause))
-        # print("Solver end printing")
-        # print("try to get assumption")
-        # print(Fs.union(background).union(eq_vars))
-        eq_core = [t for t in get_assumption_core(s) if t in eq_vars]
-        # print(eq_core)
-        if eq_core:
-            for t in eq_core:
-                s.add_assertion(Not(t))
-                eq_vars.remove(t)
-            continue
+    if engine is None:
+        engine = new_maxsat_engine()
 
-        core = [f for f in get_assumption_core(s) if f in Fs]
-        # print(core)
-        if round >= 0 and namespace is not None:
+    on_core = None
+    if round >= 0 and namespace is not None:
+        def on_core(core):
             for f in core:
                 act = namespace.get(f, None)
                 if act is not None:
                     update_activity(namespace[f], round)
-                    # minimize_memory[namespace[f]] = round
-        # print("relaxing core")
-        if relax_mode:
-            # if we are not interesting in the optimial solution, then we can get find
-            # any maximal correction subset instead of the max solution
-            max_clause = max(core, key=lambda c: action_activity.get(namespace[c], 10.0) if c in namespace else 0)
-            Fs.remove(max_clause)
-        else:
-            relax_core(s, core, Fs)
-        # print("next")
-    model = s.get_model()
+
+    pick = None
+    if relax_mode:
+        # if we are not interesting in the optimial solution, then we can get find
+        # any maximal correction subset instead of the max solution
+        def pick(core):
+            return max(core, key=lambda c: action_activity.get(namespace[c], 10.0) if c in namespace else 0)
+
+    cost, model = engine.solve(s, Fs, background, eq_vars, weights=weights, on_core=on_core, pick=pick)
     return cost, {f for f in Fs0 if not model.get_py_value(f)}, model
 
 
-def maxsat_model(s, Fs, background=None, eq_vars=None):
-    cost = 0
+def maxsat_model(s, Fs, background=None, eq_vars=None, engine=None, weights=None):
     Fs0 = Fs.copy()
 
     if not background:
@@ -1170,27 +1335,14 @@ def maxsat_model(s, Fs, background=None, eq_vars=None):
     if not eq_vars:
         eq_vars = OrderedSet()
 
-    while not s.solve(Fs.union(background).union(eq_vars)):
+    if engine is None:
+        engine = new_maxsat_engine()
 
-        eq_core = [t for t in get_assumption_core(s) if t in eq_vars]
-        if eq_core:
-            for t in eq_core:
-                s.add_assertion(Not(t))
-                eq_vars.remove(t)
-            continue
-
-        # print("cost {}".format(cost))
-        cost += 1
-        # print("try to get assumption")
-        core = [f for f in get_assumption_core(s) if f in Fs]
-        # print("relaxing core")
-        relax_core(s, core, Fs)
-        # print("next")
-    model = s.get_model()
+    cost, model = engine.solve(s, Fs, background, eq_vars, weights=weights)
     return model, {f for f in Fs0 if not model.get_py_value(f)}
 
 
-def mini_solve(solver, actions, vars, eq_vars, ignore_class=None):
+def mini_solve(solver, actions, vars, eq_vars, ignore_class=None, engine=None):
     name_space = {}
     soft_constraints = OrderedSet()
     action_by_type = {}
@@ -1223,7 +1375,7 @@ def mini_solve(solver, actions, vars, eq_vars, ignore_class=None):
         previous_act.append(act)
         action_by_type[act_type] = previous_act
 
-    model, available = maxsat_model(solver, soft_constraints, background=vars, eq_vars=eq_vars)
+    model, available = maxsat_model(solver, soft_constraints, background=vars, eq_vars=eq_vars, engine=engine)
     return model
 
 
@@ -1250,7 +1402,7 @@ def has_shadow(lit, solver):
 
 def get_temp_act_constraint_minimize(solver, rules, vars, eq_vars, inductive_assumption_table=None,
                                      addition_actions=None, round=-1, disable_minimization=False, ignore_class=None,
-                                     relax_mode=True, ub=False, over_model=None):
+                                     relax_mode=True, ub=False, over_model=None, engine=None):
     should_block = True
     # short cut
     if (relax_mode or (not addition_actions) or disable_minimization):
@@ -1371,7 +1523,7 @@ def get_temp_act_constraint_minimize(solver, rules, vars, eq_vars, inductive_ass
 
         # print("diff {} {}".format(len(soft_constraints), len(filtered_soft_constraints)))
         cost, available, model = maxsat(solver, filtered_soft_constraints, round, name_space, relax_mode=False,
-                                        background=vars, eq_vars=eq_vars)
+                                        background=vars, eq_vars=eq_vars, engine=engine)
         unqiue_act = []
         available_ignored_act = coordinate_ignored_actions(ignored_actions, model)
         if len(available) + len(available_ignored_act) >= 1:
@@ -1394,11 +1546,12 @@ def get_temp_act_constraint_minimize(solver, rules, vars, eq_vars, inductive_ass
     # print("filtered unsuccessful")
 
     cost, available, model = maxsat(solver, soft_constraints, round, name_space, relax_mode=False, background=vars,
-                                    eq_vars=eq_vars)
+                                    eq_vars=eq_vars, engine=engine)
     # print("available {}".format(str(available)))
     if no_duplicate:
         new_cost, new_available, new_name_space, new_model = no_duplicate_filter(available, name_space, solver,
-                                                                                 soft_constraints, vars, eq_vars, round)
+                                                                                 soft_constraints, vars, eq_vars, round,
+                                                                                 engine=engine)
         if new_name_space:
             available = new_available
             name_space = new_name_space
@@ -1430,7 +1583,7 @@ def get_temp_act_constraint_minimize(solver, rules, vars, eq_vars, inductive_ass
     return model
 
 
-def no_duplicate_filter(available, names_pace, solver, soft_constraints, vars, eq_vars, round):
+def no_duplicate_filter(available, names_pace, solver, soft_constraints, vars, eq_vars, round, engine=None):
     prevs_act = {}
     new_soft = OrderedSet()
     new_namespace = dict()
@@ -1453,7 +1606,7 @@ def no_duplicate_filter(available, names_pace, solver, soft_constraints, vars, e
 
     cost, available, model = maxsat(solver, new_soft.union(soft_constraints), round, namespace=None, relax_mode=False,
                                     background=vars.union(additional_bg),
-                                    eq_vars=eq_vars)
+                                    eq_vars=eq_vars, engine=engine)
     # print("the cost is {}".format(len(available)))
     solver.pop()
     return cost, available, new_namespace, model
@@ -1627,6 +1780,8 @@ class Exists(Operator):
         return action
 
     def encode(self, assumption=False, include_new_act=False, exception=None, disable=None, proof_writer=None, unsat_mode=False):
+        if self.should_include_action is not ret_false:
+            Forall.dynamic_encodes += 1
 
         if not include_new_act and not self.should_include_action():
             if self.act_include is not None:
@@ -1689,6 +1844,57 @@ class Exists(Operator):
         else:
             return base_constraint
 
+    def model_evaluate(self, values, memo):
+        if self.should_include_action() or self.input_type == _SUMObject:
+            # the witness would be a new action with free attributes, only the solver can pick it
+            return None
+        action = self.get_holding_obj()
+        body = self.func.evaulate(action)
+        if action == self.act_include:
+            return _kleene_and([model_evaluate(action.presence, values, memo), model_evaluate(body, values, memo)])
+
+        # a temporary witness stands for any action of the domain, so each present one is tried in turn
+        # by binding the witness' own attributes to its values, whatever the model assigned to them
+        input_subs = self.input_subs if self.input_subs is not None else {}
+        keys = list(type(action).index_map.keys()) + ["presence"]
+        fixed = [key for key in keys if key in input_subs]
+        free = [key for key in keys if key not in input_subs]
+        unknown = False
+        for t_action in type(action).collect_list:
+            matched = self.model_match(action, t_action, fixed, values, memo)
+            res = False
+            if matched is not False:
+                bound = [(getattr(action, key), values.get(getattr(action, key), None)) for key in free]
+                for key in free:
+                    values[getattr(action, key)] = model_evaluate(getattr(t_action, key), values, memo)
+                # the bindings change the temporary symbols, so the witness gets its own memo
+                witness_memo = {}
+                res = _kleene_and(model_evaluate(formula, values, witness_memo)
+                                  for formula in [matched, action.presence, body])
+                for var, value in bound:
+                    if value is None:
+                        values.pop(var)
+                    else:
+                        values[var] = value
+            if res is True:
+                return True
+            if res is None:
+                unknown = True
+        return None if unknown else False
+
+    @staticmethod
+    def model_match(action, t_action, keys, values, memo):
+        # the build_eq_constraint of action and t_action on keys, under values
+        unknown = False
+        for key in keys:
+            value = model_evaluate(getattr(t_action, key), values, memo)
+            expected = model_evaluate(getattr(action, key), values, memo)
+            if value is None or expected is None:
+                unknown = True
+            elif value != expected:
+                return False
+        return None if unknown else True
+
     def fol_encode(self):
         if not self.fol_object:
             self.fol_object = self.input_type(temp=True, input_subs=self.input_subs)
@@ -1747,6 +1953,15 @@ class C_Summation(Arth_Operator):
                                 disable=disable, proof_writer=proof_writer, unsat_mode=unsat_mode))
         return starting
 
+    def model_evaluate(self, values, memo):
+        starting = 0
+        for arg in self.arg_list:
+            res = model_evaluate(arg, values, memo)
+            if res is None:
+                return None
+            starting += res
+        return starting
+
     def fol_encode(self):
         starting = Int(0)
         for arg in self.arg_list:
@@ -1762,14 +1977,25 @@ upper_bound = {}
 lower_bound = {}
 
 
+def scoped(scope, constraint):
+    """
+    a fact learned under the assumptions of a single check only holds within that check's scope
+    """
+    if scope is None:
+        return constraint
+    return Implies(scope, constraint)
+
+
 def model_based_gc(ACTION, model, solver, EQ_assumption, assumptions=None, strengthen=True,
-                   value_bound_assumption=False):
+                   value_bound_assumption=False, scope=None):
     """
     probe and attempt to merge relational object. The oribing and merging is based on the minimal
-    model of the over-approximation
+    model of the over-approximation. Merges are guarded by scope when one is given
     """
     if not assumptions:
         assumptions = []
+    merged = 0
+    probed = 0
     for action in ACTION:
 
         if action == _SUMObject:
@@ -1811,113 +2037,178 @@ def model_based_gc(ACTION, model, solver, EQ_assumption, assumptions=None, stren
             k_list.append(obj)
             object_dict[key] = k_list
 
+        candidates = []
         for k_list in object_dict.values():
             for i in range(len(k_list)):
-                obj_1 = k_list[i]
                 for j in range(i + 1, len(k_list)):
-                    obj_2 = k_list[j]
-                    if (obj_1, obj_2) in history:
-                        continue
-                    else:
-                        history.add((obj_1, obj_2))
+                    pair = (k_list[i], k_list[j])
+                    if pair not in history:
+                        history.add(pair)
+                        candidates.append(pair)
+        if not candidates:
+            continue
+        probed += len(candidates)
+
+        # objects proven equal are merged in a union find, transitive merges are not asserted again
+        classes = _UnionFind()
+        merge_probes = dict([(NEQ(obj_1, obj_2), (obj_1, obj_2)) for obj_1, obj_2 in candidates])
+        for neq in probe_unsat(solver, list(merge_probes), assumptions):
+            obj_1, obj_2 = merge_probes[neq]
+            if classes.union(obj_1, obj_2):
+                merged += 1
+                solver.add_assertion(scoped(scope, EQ(obj_1, obj_2)))
+
+        # the pairs that can differ, one per pair of classes: the others are equivalent to it
+        apart = OrderedSet()
+        for obj_1, obj_2 in candidates:
+            rep_1, rep_2 = classes.find(obj_1), classes.find(obj_2)
+            if rep_1 is not rep_2 and (rep_1, rep_2) not in apart and (rep_2, rep_1) not in apart:
+                apart.add((rep_1, rep_2))
+
+        strengthening = dict()
+        for obj_1, obj_2 in apart:
+            # we can make an assumption
+            var = FreshSymbol(template="EQ%d")
+            if var not in EQ_assumption:
+                solver.add_assertion(Implies(var, EQ(obj_1, obj_2)))
+                EQ_assumption.add(var)
+            else:
+                assert False
 
-                    solver.push()
-                    solver.add_assertion(NEQ(obj_1, obj_2))
-                    if not solver.solve(assumptions):
-                        mergable = True
-                    else:
-                        mergable = False
-                    solver.pop()
-                    if mergable:
-                        print("merged")
-                        solver.add_assertion(EQ(obj_1, obj_2))
-                        break
-                    else:
-                        # we can make an assumption
-                        var = FreshSymbol(template="EQ%d")
-                        if var not in EQ_assumption:
-                            solver.add_assertion(Implies(var, EQ(obj_1, obj_2)))
-                            EQ_assumption.add(var)
-                        else:
-                            assert False
-
-                        if obj_1.presence != obj_2.presence:
-                            solver.push()
-                            solver.add_assertion(Xor(obj_1.presence, obj_2.presence))
-                            if not solver.solve(assumptions):
-                                iff = True
-                            else:
-                                iff = False
-                            solver.pop()
-                            if iff:
-                                # print("strengthened p")
-                                # obj_2.presence = obj_1.presence
-                                solver.add_assertion(Iff(obj_1.presence, obj_2.presence))
-
-                        if strengthen:
-                            if hasattr(type(obj_1), "attr_order"):
-                                for attr in type(obj_1).attr_order:
-                                    attr1 = getattr(obj_1, attr)
-                                    attr2 = getattr(obj_2, attr)
-                                    if attr1 != attr2:
-                                        solver.push()
-                                        solver.add_assertion(Not(EqualsOrIff(attr1, attr2)))
-                                        if not solver.solve(assumptions):
-                                            iff = True
-                                        else:
-                                            iff = False
-                                        solver.pop()
-                                        if iff:
-                                            # print("strengthened {}".format(attr))
-                                            # setattr(obj_2, attr, attr1)
-                                            solver.add_assertion(EqualsOrIff(attr1, attr2))
-
-
-def clean_up_action(s, assumptions, ACT):
+            if obj_1.presence != obj_2.presence:
+                strengthening[Xor(obj_1.presence, obj_2.presence)] = Iff(obj_1.presence, obj_2.presence)
+            if strengthen and hasattr(type(obj_1), "attr_order"):
+                for attr in type(obj_1).attr_order:
+                    attr1 = getattr(obj_1, attr)
+                    attr2 = getattr(obj_2, attr)
+                    if attr1 != attr2:
+                        strengthening[Not(EqualsOrIff(attr1, attr2))] = EqualsOrIff(attr1, attr2)
+
+        for probe in probe_unsat(solver, list(strengthening), assumptions):
+            solver.add_assertion(scoped(scope, strengthening[probe]))
+    if probed:
+        print("gc: {} of {} candidate pairs merged".format(merged, probed))
+
+
+class _UnionFind():
+    def __init__(self):
+        self.parent = dict()
+
+    def find(self, x):
+        root = x
+        while self.parent.get(root, root) is not root:
+            root = self.parent[root]
+        while x is not root:
+            x, self.parent[x] = self.parent.get(x, x), root
+        return root
+
+    def union(self, x, y):
+        # False when x and y were already in the same class
+        root_x, root_y = self.find(x), self.find(y)
+        if root_x is root_y:
+            return False
+        self.parent[root_y] = root_x
+        return True
+
+
+def probe_unsat(solver, probes, assumptions):
+    """
+    the probes that are unsatisfiable together with the solver's assertions under the assumptions.
+    Instead of one solve per probe, each solve asks for a model satisfying any pending probe; every probe
+    that model satisfies is refuted at once, and the probes left when no such model exists are the unsat ones
+    """
+    return _probe_unsat(solver, probes, assumptions)[0]
+
+
+def _probe_unsat(solver, probes, assumptions):
+    # probe_unsat, also returning the number of solver calls made
+    if not probes:
+        return [], 0
+    solver.push()
+    indicators = dict()
+    for probe in probes:
+        indicator = FreshSymbol(template="PROBE%d")
+        solver.add_assertion(Implies(indicator, probe))
+        indicators[probe] = indicator
+    pending = list(probes)
+    solves = 0
+    while pending:
+        round_lit = FreshSymbol(template="PROBE_ROUND%d")
+        solver.add_assertion(Implies(round_lit, Or([indicators[probe] for probe in pending])))
+        solves += 1
+        if not solver.solve(list(assumptions) + [round_lit]):
+            break
+        model = solver.get_model()
+        pending = [probe for probe in pending if not model.get_py_value(probe)]
+    solver.pop()
+    return pending, solves
+
+
+def forced_false(s, assumptions, presences):
+    """
+    the presence literals that cannot hold under the assumptions. Every presence true in a model is live,
+    so one solve clears all of them and only the rest are probed again, instead of a solve per action
+    """
+    presences = list(OrderedSet(presences))
+    if not presences:
+        return OrderedSet()
+    forced, solves = _probe_unsat(s, presences, assumptions)
+    print("liveness: {} of {} actions forced absent in {} solver calls ({} saved)".format(
+        len(forced), len(presences), solves, len(presences) - solves))
+    return OrderedSet(forced)
+
+
+def clean_up_action(s, assumptions, ACT, scope=None):
+    # under a scope the action is only disabled for the current check, so the object itself is kept
     if ACT == _SUMObject:
         return
     if len(ACT.syn_collect_list) > ACT.threshold:
         ACT.threshold = int(ACT.threshold * ACT.increase_ratio)
-        for act in ACT.syn_collect_list:
-            test_var = assumptions.union([act.presence])
-            if not s.solve(test_var):
-                if act.disabled():
-                    continue
-                s.add_assertion(Not(act.presence))
+        candidates = [act for act in ACT.syn_collect_list if not act.disabled()]
+        forced = forced_false(s, assumptions, [act.presence for act in candidates])
+        for act in candidates:
+            if act.presence in forced:
+                s.add_assertion(scoped(scope, Not(act.presence)))
                 if act.under_var:
-                    s.add_assertion(Not(act.under_var))
-                act.disable()
+                    s.add_assertion(scoped(scope, Not(act.under_var)))
+                if scope is None:
+                    act.disable()
                 print("disabled {}".format(act))
 
 
-def summation_clean_up(s, assumptions):
+def summation_clean_up(s, assumptions, scope=None):
     if len(Summation.collections) > _SUMObject.threshold:
         _SUMObject.threshold = int(_SUMObject.threshold * _SUMObject.increase_ratio)
+        forced = forced_false(s, assumptions, [sum.get_action().presence for sum in Summation.collections
+                                               if sum.has_action() and not sum.get_action().disabled()])
         for sum in Summation.collections:
             if sum.has_action():
                 action = sum.get_action()
                 if action.disabled():
                     continue
-                test_var = assumptions.union([action.presence])
-                if not s.solve(test_var):
-                    s.add_assertion(Not(action.presence))
+                if action.presence in forced:
+                    s.add_assertion(scoped(scope, Not(action.presence)))
                     print("disabled action {}".format(action))
-                    action.disable()
+                    if scope is None:
+                        action.disable()
                     while sum.has_child():
                         new_sum, new_act = sum.act_include.child_sum
                         if not new_act.disabled():
-                            s.add_assertion(Not(new_act.presence))
-                            new_act.disable()
+                            s.add_assertion(scoped(scope, Not(new_act.presence)))
+                            if scope is None:
+                                new_act.disable()
                         if not new_sum.get_action().disabled():
-                            s.add_assertion(Not(new_sum.get_action().presence))
-                            new_sum.get_action().disable()
+                            s.add_assertion(scoped(scope, Not(new_sum.get_action().presence)))
+                            if scope is None:
+                                new_sum.get_action().disable()
                         sum = new_sum
 
+        forced = forced_false(s, assumptions, [sum.get_action().presence for sum in Summation.frontier
+                                               if sum.has_action])
         for sum in Summation.frontier:
             if sum.has_action:
                 action = sum.get_action()
-                test_var = assumptions.union([action.presence])
-                if not s.solve(test_var):
+                if action.presence in forced:
                     s.add_assertion(Not(action.presence))
                     action.disable()
                     if sum.has_child():
@@ -2201,7 +2492,7 @@ class Summation(Arth_Operator):
                 # print("add assertion add_inv {}".format(serialize(Implies(Not(self.parent_info.presence), Not(self.get_action().presence)))))
             # solver.add_assertion(Implies(Not(self.get_action().presence), EQ(self.get_action().value, self.under_value)))
 
-    def encode(self, assumption=False, include_new_act=False, exception=None, disable=None, proof_writer=None, unsat_mode=False):
+    def get_holding_obj(self, include_new_act=False):
         if not include_new_act:
             if self.act_include is not None:
                 action = self.act_include
@@ -2221,6 +2512,11 @@ class Summation(Arth_Operator):
                 self.act_include.parent = self
                 self.act_include.parent_info = self.parent_info
             action = self.act_include
+        return action
+
+    def encode(self, assumption=False, include_new_act=False, exception=None, disable=None, proof_writer=None, unsat_mode=False):
+        Forall.dynamic_encodes += 1
+        action = self.get_holding_obj(include_new_act=include_new_act)
 
         if include_new_act:
             Exists.new_included.add(action)
@@ -2240,6 +2536,11 @@ class Summation(Arth_Operator):
 
         return ITE(action.presence, action.value, under_value)
 
+    def model_evaluate(self, values, memo):
+        # the value disable encoding gives, the sum over the snap_shot
+        under_value, _ = self.get_holding_obj().under_encode(disable=True)
+        return model_evaluate(under_value, values, memo)
+
     def has_action(self):
         return self.act_include is not None or self.act_non_include is not None
 
@@ -2345,6 +2646,10 @@ def update_overapprox():
 class Forall(Operator):
     count = 0
     pending_defs = OrderedSet()
+    # number of encodings so far whose result depends on the current domain (nested foralls, sums,
+    # exists with a dynamic inclusion policy). An instance whose encoding made none of them is
+    # fully defined once encoded, so later rounds do not need to visit it again
+    dynamic_encodes = 0
 
     def __init__(self, input_type, func, reference=None):
         super().__init__()
@@ -2364,6 +2669,9 @@ class Forall(Operator):
         self.rid = None
         self.consider_op = False
         self.fol_object = None
+        self.watermark = 0
+        self.watermark_act = None
+        self.revisit = OrderedSet()
 
 
     def clear(self):
@@ -2376,6 +2684,22 @@ class Forall(Operator):
         self.rid = None
         self.consider_op = False
         self.fol_object = None
+        self.watermark = 0
+        self.watermark_act = None
+        self.revisit = OrderedSet()
+
+    def delta_actions(self):
+        '''
+        the instances an encoding round has to visit: the actions added to the domain since the last
+        round, and the already instantiated ones whose encoding depends on the domain.
+        Falls back to the whole snap_shot if the domain was reset underneath the watermark
+        '''
+        snap_shot = self.input_type.snap_shot
+        if self.watermark <= len(snap_shot) and \
+                (self.watermark == 0 or snap_shot[self.watermark - 1] is self.watermark_act):
+            return list(self.revisit) + snap_shot[self.watermark:]
+        self.revisit = OrderedSet()
+        return snap_shot
 
 
     def fol_encode(self):
@@ -2389,24 +2713,19 @@ class Forall(Operator):
         return quantified
 
     def encode(self, assumption=False, include_new_act=False, exception=None, disable=None, proof_writer=None, unsat_mode=False):
+        Forall.dynamic_encodes += 1
         constraint = []
         # base construction
         consider_exception = not exception is None
+        # disable and exception encodings need every instance, the others only the new ones
+        delta = not disable and not consider_exception
 
         if self.input_type != _SUMObject:
-            op = self.invert()
-            op_constraint = op.get_holding_obj(assumption=False, include_new_act=False, exception=None, disable=None,
-                                               proof_writer=None)
-            if not self.consider_op:
-                forall_exists_link = IFF(self.var, Not(op_constraint.presence))
-                Forall.pending_defs.add(forall_exists_link)
-                self.consider_op = True
-
-                if proof_writer:
-                    proof_writer.add_forall_exist_link(self, Not(op_constraint.presence))
+            self.link_op(proof_writer=proof_writer)
 
-        for action in self.input_type.snap_shot:
+        for action in (self.delta_actions() if delta else self.input_type.snap_shot):
             if not action.disabled() and ((not consider_exception) or (not action in exception)):
+                dynamic_before = Forall.dynamic_encodes
                 eval_func = self.func.evaulate(action)
                 if self.reference:
                     presence = Bool_Terminal(action.presence)
@@ -2439,13 +2758,45 @@ class Forall(Operator):
                         # assert (Implies(self.var, base_constraint) in Forall.pending_defs)
                         # print("weird")
                         pass
+                    if Forall.dynamic_encodes != dynamic_before:
+                        self.revisit.add(action)
                 else:
                     constraint.append(base_constraint)
+        if delta and self.input_type.snap_shot:
+            self.watermark = len(self.input_type.snap_shot)
+            self.watermark_act = self.input_type.snap_shot[-1]
         if not disable:
             return self.var
         else:
             return And(constraint)
 
+    def link_op(self, proof_writer=None):
+        op = self.invert()
+        op_constraint = op.get_holding_obj(assumption=False, include_new_act=False, exception=None, disable=None,
+                                           proof_writer=None)
+        if not self.consider_op:
+            forall_exists_link = IFF(self.var, Not(op_constraint.presence))
+            Forall.pending_defs.add(forall_exists_link)
+            self.consider_op = True
+
+            if proof_writer:
+                proof_writer.add_forall_exist_link(self, Not(op_constraint.presence))
+
+    def model_evaluate(self, values, memo):
+        unknown = False
+        for action in self.input_type.snap_shot:
+            if action.disabled():
+                continue
+            presence = model_evaluate(action.presence, values, memo)
+            if presence is False:
+                continue
+            res = model_evaluate(self.func.evaulate(action), values, memo)
+            if res is False and presence:
+                return False
+            if res is not True:
+                unknown = True
+        return None if unknown else True
+
     def invert(self):
         if self.op is None:
             self.op = Exists(self.input_type, invert(self.func), reference=self.reference)
@@ -2460,7 +2811,8 @@ class Forall(Operator):
         return "Forall_{}".format(self.var)
 
     def __hash__(self):
-        return hash(self.__repr__())
+        # same identity as the repr, without printing the symbol on every lookup
+        return hash(self.var)
 
     def to_string(self):
         return "(forall {} {} {})".format(self.print_act.print_name, self.input_type.action_name,
@@ -2671,6 +3023,17 @@ def _Multi(left, right):
     return Times(_cast_to_pysmt_type(left), _cast_to_pysmt_type(right))
 
 
+py_operator_mapping = {_LT: operator.lt, _GT: operator.gt, _LE: operator.le, _GE: operator.ge, _EQ: operator.eq,
+                       _NEQ: operator.ne, _Plus: operator.add, _Minus: operator.sub, _Multi: operator.mul}
+
+
+def _apply_operator(op, left, right):
+    py_op = py_operator_mapping.get(op, None)
+    if py_op is None or left is None or right is None:
+        return None
+    return py_op(left, right)
+
+
 arth_op = [_Minus, _Plus]
 
 
@@ -2815,3 +3178,16 @@ def add_background_theories(Actions, state_action, Rules, bcr=False):
     Actions.extend(get_background_actions())
     return Rules + get_background_rules(bcr)
 
+
+register_state(sys.modules[__name__], ["controll_varaible_eq", "controll_varaible_eq_r", "raw_control_variable",
+                                       "controll_variable", "controll_variable_scope", "control_var_sym",
+                                       "learned_inv", "model_action_mapping", "text_ref", "minimize_memory",
+                                       "action_activity", "shadow_dict", "history", "upper_bound", "lower_bound"])
+register_state(C_AND, ["cache"], lambda: BoundedCache(and_cache))
+register_state(C_OR, ["cache"], lambda: BoundedCache(or_cache))
+register_state(Function, ["Function_cache"])
+register_state(Predicate, ["Predicate_Cache"])
+register_state(Exists, ["Temp_ACTs", "check_ACTS", "new_included", "pending_defs"])
+register_state(Forall, ["pending_defs"])
+register_state(Summation, ["current_under", "collections", "frontier", "under_initialized"])
+register_state(_SUMObject, ["collect_list", "temp_collection_set", "snap_shot"])
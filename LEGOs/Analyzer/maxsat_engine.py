@@ -0,0 +1,227 @@
+import time
+import weakref
+
+import z3
+from pysmt.shortcuts import Symbol, And, Or, Not, Iff, TRUE
+from pysmt.solvers.z3 import Z3Model
+
+temp_count = 0
+
+
+def add_def(s, fml):
+    global temp_count
+    name = Symbol("def_{}".format(temp_count))
+    temp_count += 1
+    s.add_assertion(Iff(name, fml))
+    return name
+
+
+def relax_core(s, core, Fs, weights=None, define=add_def):
+    # max resolution of the core: the soft literals of the core are replaced by
+    # "core[i + 1] or all of core[..i]", so that one of them may be false at the core's minimum weight.
+    # Literals weighing more than that minimum stay soft with the rest of their weight
+    prefix = TRUE()
+    if weights is None:
+        Fs -= {f for f in set(core)}
+        w = 1
+    else:
+        w = min(weights.get(f, 1) for f in core)
+        for f in core:
+            rest = weights.get(f, 1) - w
+            if rest > 0:
+                weights[f] = rest
+            else:
+                Fs.discard(f)
+    for i in range(len(core) - 1):
+        prefix = define(s, And(core[i], prefix))
+        relaxed = define(s, Or(prefix, core[i + 1]))
+        if weights is not None:
+            weights[relaxed] = weights.get(relaxed, 0) + w if relaxed in Fs else w
+        Fs |= {relaxed}
+    return w
+
+
+def get_assumption_core(solver):
+    assumptions = solver.z3.unsat_core()
+    pysmt_assumptions = [solver.converter.back(t) for t in assumptions]
+    return pysmt_assumptions
+
+
+class CoreGuidedMaxSAT():
+    '''
+    The core guided loop maxsat has always run: solve under the soft literals, relax the core
+    by max resolution and repeat; equality assumptions (eq_vars) met in a core are dropped for good instead.
+    An engine may serve many calls, so it should live as long as what it learns stays useful
+    (one check_property_refining run); with a timeout (seconds per call) the soft literals left when
+    it runs out are given up and a model of the hard part is returned.
+    '''
+    name = "core"
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.calls = 0
+        self.solves = 0
+        self.timeouts = 0
+
+    def check(self, s, assumptions):
+        self.solves += 1
+        return s.solve(assumptions)
+
+    def define(self, s, fml):
+        return add_def(s, fml)
+
+    def relax(self, s, core, Fs, weights):
+        return relax_core(s, core, Fs, weights, define=self.define)
+
+    def solve(self, s, Fs, background, eq_vars, weights=None, on_core=None, pick=None):
+        '''
+        cost and model of a maximum weight subset of the soft literals Fs (weight 1 unless given in weights)
+        holding together with the background literals. Fs and eq_vars are relaxed in place.
+        on_core is shown every core of soft literals; pick, if given, chooses the literal of a core
+        to drop instead of relaxing the core (any correction set rather than an optimal one)
+        '''
+        self.calls += 1
+        weights = dict(weights) if weights else None
+        deadline = None if self.timeout is None else time.time() + self.timeout
+        cost = self.solve_level(s, Fs, None, background, eq_vars, weights, deadline, on_core, pick)
+        return cost, s.get_model()
+
+    def solve_level(self, s, Fs, level, background, eq_vars, weights, deadline, on_core, pick):
+        # the core loop over the soft literals weighing at least level (all of Fs without a level)
+        def weighing(f):
+            return weights.get(f, 1) if weights else 1
+
+        active = Fs if level is None else type(Fs)([f for f in Fs if weighing(f) >= level])
+        cost = 0
+        while not self.check(s, active.union(background).union(eq_vars)):
+            core = get_assumption_core(s)
+            eq_core = [t for t in core if t in eq_vars]
+            if eq_core:
+                for t in eq_core:
+                    s.add_assertion(Not(t))
+                    eq_vars.remove(t)
+                continue
+
+            core = [f for f in core if f in active]
+            if on_core is not None:
+                on_core(core)
+            if deadline is not None and time.time() > deadline:
+                self.timeouts += 1
+                print("maxsat timeout, {} soft constraints given up".format(len(active)))
+                active = type(Fs)()
+                deadline = None
+                continue
+            if pick is not None:
+                Fs.remove(pick(core))
+            else:
+                cost += self.relax(s, core, Fs, weights)
+                if level is not None:
+                    active = type(Fs)([f for f in Fs if weighing(f) >= level])
+        return cost
+
+
+class StratifiedMaxSAT(CoreGuidedMaxSAT):
+    '''
+    RC2 style: the soft literals join by decreasing weight, each level solved by the core loop before
+    the lighter ones are added (with a single weight this is the plain core loop).
+    Relaxation definitions and cores found at a solver's base level, where nothing can be popped
+    any more, are kept per solver and replayed on later calls: a known core whose literals are all
+    soft or assumed again is relaxed without solving for it.
+    '''
+    name = "stratified"
+
+    def __init__(self, timeout=None):
+        CoreGuidedMaxSAT.__init__(self, timeout)
+        self.definitions = weakref.WeakKeyDictionary()
+        self.cores = weakref.WeakKeyDictionary()
+        self.replayed = 0
+
+    def define(self, s, fml):
+        known = self.definitions.setdefault(s, dict())
+        name = known.get(fml)
+        if name is None:
+            name = add_def(s, fml)
+            if s.z3.num_scopes() == 0:
+                known[fml] = name
+        return name
+
+    def check(self, s, assumptions):
+        solved = CoreGuidedMaxSAT.check(self, s, assumptions)
+        if not solved and s.z3.num_scopes() == 0:
+            core = get_assumption_core(s)
+            self.cores.setdefault(s, dict())[frozenset(core)] = core
+        return solved
+
+    def solve(self, s, Fs, background, eq_vars, weights=None, on_core=None, pick=None):
+        if pick is not None:
+            return CoreGuidedMaxSAT.solve(self, s, Fs, background, eq_vars, weights, on_core, pick)
+        self.calls += 1
+        weights = dict(weights) if weights else None
+        deadline = None if self.timeout is None else time.time() + self.timeout
+        cost = self.replay(s, Fs, background, eq_vars, weights, on_core)
+        levels = sorted(set(weights.values()).union([1]), reverse=True)[:-1] if weights else []
+        # the last level takes every soft literal left
+        for level in levels + [None]:
+            cost += self.solve_level(s, Fs, level, background, eq_vars, weights, deadline, on_core, None)
+        return cost, s.get_model()
+
+    def replay(self, s, Fs, background, eq_vars, weights, on_core):
+        cost = 0
+        # cores that needed an equality assumption are left to the loop, which drops the assumption instead
+        for core in list(self.cores.get(s, dict()).values()):
+            soft = [f for f in core if f in Fs]
+            if soft and all(f in Fs or f in background for f in core):
+                if on_core is not None:
+                    on_core(soft)
+                cost += self.relax(s, soft, Fs, weights)
+                self.replayed += 1
+        return cost
+
+
+class OptimizeMaxSAT():
+    '''
+    z3's Optimize over a copy of the solver's assertions, with the background literals as hard facts.
+    Equality assumptions are soft literals weighing more than all the others together; the ones it falsifies
+    are dropped from eq_vars for good, as the core loop does. Nothing is learned between calls and no cores
+    are shown to on_core. When z3 gives up (timeout) without a model, the core loop with no time left answers.
+    '''
+    name = "optimize"
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.calls = 0
+        self.solves = 0
+        self.timeouts = 0
+
+    def solve(self, s, Fs, background, eq_vars, weights=None, on_core=None, pick=None):
+        self.calls += 1
+        self.solves += 1
+        weights = weights if weights else dict()
+        opt = z3.Optimize()
+        if self.timeout is not None:
+            opt.set("timeout", max(1, int(self.timeout * 1000)))
+        opt.add(s.z3.assertions())
+        for lit in background:
+            opt.add(s.converter.convert(lit))
+        total = sum(weights.get(f, 1) for f in Fs)
+        for lit in eq_vars:
+            opt.add_soft(s.converter.convert(lit), total + 1)
+        for lit in Fs:
+            opt.add_soft(s.converter.convert(lit), weights.get(lit, 1))
+
+        res = opt.check()
+        if res == z3.unknown:
+            self.timeouts += 1
+            print("maxsat timeout, {} soft constraints given up".format(len(Fs)))
+            return CoreGuidedMaxSAT(timeout=0).solve(s, Fs, background, eq_vars, weights, on_core, pick)
+        assert res == z3.sat
+        model = Z3Model(s.environment, opt.model())
+        for t in list(eq_vars):
+            if not model.get_py_value(t):
+                s.add_assertion(Not(t))
+                eq_vars.remove(t)
+        cost = sum(weights.get(f, 1) for f in Fs if not model.get_py_value(f))
+        return cost, model
+
+
+MAXSAT_ENGINES = dict([(engine.name, engine) for engine in [CoreGuidedMaxSAT, StratifiedMaxSAT, OptimizeMaxSAT]])
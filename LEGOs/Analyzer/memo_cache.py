@@ -0,0 +1,129 @@
+import weakref
+from collections import OrderedDict
+
+_missing = object()
+
+
+class CacheGroup():
+    '''
+    Capacity and hit/miss/eviction counters shared by every memo table of one kind
+    (e.g. the result tables of all Function objects). Counters are cumulative until reset.
+    '''
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.collected = 0
+        self.tables = weakref.WeakSet()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.collected = 0
+
+    def stats(self):
+        return {"capacity": self.capacity, "size": sum(len(t) for t in self.tables),
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "collected": self.collected}
+
+
+class BoundedCache():
+    '''
+    LRU memo table. Once a table holds more than its group's capacity the least recently used
+    entry is dropped. With weak_keys, keys that allow weak references (actions) are not kept
+    alive by the table: the entry goes away when the key is garbage collected.
+    '''
+
+    def __init__(self, group, weak_keys=False):
+        self.group = group
+        self.weak_keys = weak_keys
+        self.data = OrderedDict()
+        group.tables.add(self)
+
+    def _key(self, key, callback=None):
+        if self.weak_keys:
+            try:
+                return weakref.ref(key, callback)
+            except TypeError:
+                pass
+        return key
+
+    def _collect(self, ref):
+        if self.data.pop(ref, None) is not None:
+            self.group.collected += 1
+
+    def get(self, key, default=None):
+        k = self._key(key)
+        value = self.data.get(k, _missing)
+        if value is _missing:
+            self.group.misses += 1
+            return default
+        self.group.hits += 1
+        self.data.move_to_end(k)
+        return value
+
+    def __setitem__(self, key, value):
+        k = self._key(key, self._collect)
+        self.data[k] = value
+        self.data.move_to_end(k)
+        capacity = self.group.capacity
+        while capacity is not None and len(self.data) > capacity:
+            self.data.popitem(last=False)
+            self.group.evictions += 1
+
+    def __contains__(self, key):
+        return self._key(key) in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def keys(self):
+        for k in list(self.data.keys()):
+            if isinstance(k, weakref.ref):
+                k = k()
+                if k is None:
+                    continue
+            yield k
+
+    def __iter__(self):
+        return self.keys()
+
+    def items(self):
+        for k, v in list(self.data.items()):
+            if isinstance(k, weakref.ref):
+                k = k()
+                if k is None:
+                    continue
+            yield k, v
+
+    def values(self):
+        return list(self.data.values())
+
+    def clear(self):
+        self.data.clear()
+
+
+# capacities are per table; None means unbounded
+function_cache = CacheGroup("function", 65536)
+predicate_cache = CacheGroup("predicate", 100)
+and_cache = CacheGroup("and", 65536)
+or_cache = CacheGroup("or", 65536)
+
+CACHE_GROUPS = {g.name: g for g in [function_cache, predicate_cache, and_cache, or_cache]}
+
+
+def set_cache_capacity(name, capacity):
+    CACHE_GROUPS[name].capacity = capacity
+
+
+def cache_stats():
+    return {name: g.stats() for name, g in CACHE_GROUPS.items()}
+
+
+def reset_cache_stats():
+    for g in CACHE_GROUPS.values():
+        g.reset()
@@ -0,0 +1,134 @@
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+
+PHASES = ["encode", "approx", "solve", "check_trace", "minimize", "model_based_gc", "cleanup", "proof", "slice"]
+
+
+class PhaseProfiler():
+    '''
+    Records the time spent in each phase of check_property_refining, per check and per CEGAR round,
+    in a single run. Phases nest (proof writing happens inside encoding), so phase times are inclusive.
+    '''
+
+    def __init__(self):
+        self.events = []
+        self.check = ""
+        self.round = 0
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    @contextmanager
+    def phase(self, name, **info):
+        # info (e.g. the domain size at a solver call) is stored on the event as is
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            event = {"check": self.check, "round": self.round, "phase": name,
+                     "start": start - self.origin, "duration": end - start, "pid": self.pid}
+            event.update(info)
+            self.events.append(event)
+
+    def wrap(self, obj, name):
+        # times every outermost method call made on obj as one occurrence of the phase
+        return _TimedProxy(obj, self, name)
+
+    def total(self, phase, check=None):
+        return sum(e["duration"] for e in self.events
+                   if e["phase"] == phase and (check is None or e["check"] == check))
+
+    def rounds(self):
+        # aggregate the events into one row per (check, round, phase)
+        table = {}
+        for e in self.events:
+            key = (e["check"], e["round"], e["phase"])
+            calls, duration = table.get(key, (0, 0.0))
+            table[key] = calls + 1, duration + e["duration"]
+        return [{"check": c, "round": r, "phase": p, "calls": calls, "seconds": duration}
+                for (c, r, p), (calls, duration) in table.items()]
+
+    def to_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=["check", "round", "phase", "calls", "seconds"])
+            writer.writeheader()
+            writer.writerows(self.rounds())
+
+    def to_json(self, path):
+        totals = {}
+        for e in self.events:
+            totals[e["phase"]] = totals.get(e["phase"], 0.0) + e["duration"]
+        with open(path, 'w') as f:
+            json.dump({"totals": totals, "rounds": self.rounds(), "events": self.events}, f, indent=2)
+
+    def to_chrome_trace(self, path):
+        # complete ("X") events in microseconds, loadable in chrome://tracing and Perfetto
+        trace = [{"name": e["phase"], "cat": e["check"], "ph": "X", "ts": e["start"] * 1e6,
+                  "dur": e["duration"] * 1e6, "pid": e["pid"], "tid": e["pid"],
+                  "args": {"check": e["check"], "round": e["round"]}} for e in self.events]
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+    def export(self, prefix):
+        self.to_csv(prefix + "_phases.csv")
+        self.to_json(prefix + "_phases.json")
+        self.to_chrome_trace(prefix + "_trace.json")
+
+
+def summarize(events):
+    '''
+    solver calls (solve phases), CEGAR rounds and the largest final domain size over the checks,
+    from the events of a PhaseProfiler (or of its exported _phases.json)
+    '''
+    rounds = 0
+    previous = None
+    domain = {}
+    for e in events:
+        key = (e["check"], e["round"])
+        if key != previous:
+            rounds += 1
+            previous = key
+        if "domain" in e:
+            domain[e["check"]] = e["domain"]
+    return {"solver_calls": sum(1 for e in events if e["phase"] == "solve"),
+            "cegar_rounds": rounds,
+            "domain_size": max(domain.values(), default=0)}
+
+
+class _TimedProxy():
+    def __init__(self, obj, profiler, name):
+        self._obj = obj
+        self._profiler = profiler
+        self._name = name
+
+    def __getattr__(self, item):
+        attr = getattr(self._obj, item)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            with self._profiler.phase(self._name):
+                return attr(*args, **kwargs)
+
+        return timed
+
+
+class _NoProfiler():
+    '''
+    stand-in used when no profiler is given, so the solving loop does not branch on profiling
+    '''
+    round = 0
+    check = ""
+
+    @contextmanager
+    def phase(self, name, **info):
+        yield
+
+    def wrap(self, obj, name):
+        return obj
+
+
+NO_PROFILER = _NoProfiler()
@@ -1,3 +1,5 @@
+import sys
+
 from pysmt.fnode import FNode
 
 from logic_operator import *
@@ -31,6 +33,7 @@ def otherwise(cond, primary, alt):
 
 
 M = None
+register_state(sys.modules[__name__], ["M"])
 
 
 def complie_measure(MEASURE):
@@ -46,6 +46,30 @@ def print_trace(model, ACTION, state_action, include_temp = False, should_print=
     return len(entry) + len(sum_class), output_str
 
 
+def trace_records(model, ACTION, state_action, ignore_class = None, scaler_mask = None):
+    # same objects and order as print_trace, as typed records (see get_record_dict) instead of strings
+    all_objects = []
+    for action in ACTION:
+        all_objects += action.collect_list
+
+    filtered_objects = filter(lambda obj: model.get_py_value(obj.presence), all_objects)
+    sorted_objects = multisort(list(filtered_objects), [(lambda obj: model.get_py_value(obj.time) if hasattr(obj, "time") else -1,
+                                                         False),
+                     (lambda obj: type(obj) in state_action, True)])
+    records = []
+    entry = OrderedSet()
+    for obj in sorted_objects:
+        if ignore_class is not None and type(obj) in ignore_class:
+            continue
+        if isinstance(obj, _SUMObject):
+            continue
+        res = obj.get_record(model, debug=False, mask=scaler_mask)
+        if res not in entry:
+            entry.add(res)
+            records.append(obj.get_record_dict(model, mask=scaler_mask))
+    return records
+
+
 def model_based_inst(model, ACTION, completeness = False, time=-1, measure_class = None, should_print=False, scaler_mask = None):
     output_str= ""
     all_objects = []
@@ -1,11 +1,15 @@
 import copy
+import sys
 from collections.abc import Iterable
+from fractions import Fraction
 
 from ordered_set import OrderedSet
 from pysmt.shortcuts import *
 from pysmt import fnode
 from pysmt.typing import STRING, INT, REAL
 
+from analysis_context import register_state
+
 request_action_map = dict()
 attribute_variable_map = dict()
 
@@ -75,6 +79,7 @@ class UnionAction():
 
 
 class Action():
+    __slots__ = ("token", "presence", "card_id", "_sym_constraint", "is_disabled", "parent_info", "__weakref__")
     presence_counter = 0
     sym_presence = Symbol("action_presence", typename=BOOL)
 
@@ -82,19 +87,30 @@ class Action():
         value = self.get_counter_update()
         if not name:
             self.token = "action_presence_{}".format(value)
-            self.presence = Symbol("action_presence_{}".format(value), typename=BOOL)
         else:
             self.token = "{}_presence".format(name)
-            self.presence = Symbol("{}_presence".format(name), typename=BOOL)
-
-        self.card = Symbol("action_card_{}".format(value), typename=INT)
-
-        self.cardinality_constraint = And(Iff(self.presence, Equals(self.card, Int(1))),
-                                          Iff(Not(self.presence), Equals(self.card, Int(0))))
-        self.sym_constraint = OrderedSet()
+        self.presence = Symbol(self.token, typename=BOOL)
+        self.card_id = value
+        self._sym_constraint = None
         self.is_disabled = False
         self.parent_info = None
 
+    # the cardinality encoding is only used by the constraint_solver backend, build it on demand
+    @property
+    def card(self):
+        return Symbol("action_card_{}".format(self.card_id), typename=INT)
+
+    @property
+    def cardinality_constraint(self):
+        presence = Symbol(self.token, typename=BOOL)
+        return And(Iff(presence, Equals(self.card, Int(1))), Iff(Not(presence), Equals(self.card, Int(0))))
+
+    @property
+    def sym_constraint(self):
+        if self._sym_constraint is None:
+            self._sym_constraint = OrderedSet()
+        return self._sym_constraint
+
     def get_counter_update(self):
         presence_counter = Action.presence_counter
         Action.presence_counter += 1
@@ -240,13 +256,15 @@ def create_action(action_name, attributes, constraint_dict, sub_actions=None, de
     else:
         sub_action_names = [sub_name for (sub_name, _, _) in sub_actions]
 
+    type_constraints = [constraint_dict.get(attr_type, (None, lambda _: TRUE()))[1] for _, attr_type in attributes]
+
     ### for direct FOL encoding ###
     fol_func_attributes = [constraint_dict[v][0] for _, v in attributes]
     fol_function = FunctionType(BOOL, fol_func_attributes)
 
     def __init__(self, temp=False, input_subs=None, print_only=False):
-        self.constraint = []
         self.delayed_constraint = []
+        self.min_var = None
         # self.under_encoded = False
 
         if temp:
@@ -255,7 +273,6 @@ def create_action(action_name, attributes, constraint_dict, sub_actions=None, de
             self.under_encoded = -1
 
         self.under_var = None
-        self.min_var = None
 
         if input_subs is None:
             input_subs = {}
@@ -283,31 +300,24 @@ def create_action(action_name, attributes, constraint_dict, sub_actions=None, de
             value = input_subs.get("presence")
             setattr(self, "presence", value)
 
+        # the attribute values the type constraints and the FOL application are built over
+        self.named_attr = []
         for attr, attr_type in attributes:
-            var_type, type_constraint = constraint_dict.get(attr_type, lambda _: TRUE())
             if attr in input_subs:
                 value = input_subs.get(attr)
-                setattr(self, attr, value)
-                self.constraint.append(type_constraint(getattr(self, attr)))
             else:
+                var_type = constraint_dict[attr_type][0]
                 if print_only:
-                    variable = Symbol(
-                        "p_{}_{}_{}".format(action_name, self.get_index_update(attr, print_only=True), attr),
-                        typename=var_type)
-                    setattr(self, attr, variable)
-                    self.constraint.append(type_constraint(getattr(self, attr)))
-
+                    value = Symbol("p_{}_{}_{}".format(action_name, self.get_index_update(attr, print_only=True), attr),
+                                   typename=var_type)
                 elif temp:
-                    variable = Symbol("t_{}_{}_{}".format(action_name, self.get_index_update(attr, temp=True), attr),
-                                      typename=var_type)
-                    setattr(self, attr, variable)
-                    self.constraint.append(type_constraint(getattr(self, attr)))
-
+                    value = Symbol("t_{}_{}_{}".format(action_name, self.get_index_update(attr, temp=True), attr),
+                                   typename=var_type)
                 else:
-                    variable = Symbol("{}_{}_{}".format(action_name, self.get_index_update(attr), attr),
-                                      typename=var_type)
-                    setattr(self, attr, variable)
-                    self.constraint.append(type_constraint(getattr(self, attr)))
+                    value = Symbol("{}_{}_{}".format(action_name, self.get_index_update(attr), attr),
+                                   typename=var_type)
+            setattr(self, attr, value)
+            self.named_attr.append(value)
 
         if sub_actions is not None:
             for act_name, action_type, variable_mapping in sub_actions:
@@ -358,15 +368,27 @@ def create_action(action_name, attributes, constraint_dict, sub_actions=None, de
             else:
                 type(self).temp_collection_set.add(self)
 
-        self.constraint = Implies(self.presence, And(self.constraint))
-        if hasattr(self, "time"):
+        # the type constraint and the FOL application are built on first use (see constraint, fol_presence)
+        self.constraint_presence = self.presence
+        self._constraint = None
+        self._fol_presence = None
+        if hasattr(self, "time") and not print_only:
             add_timed_obj(self.time, self)
 
-        ### FOL ###
-        self.fol_func = Symbol(self.action_name, fol_function)
-        attrs = type(self).attr_order
-        self.named_attr = [getattr(self, attr) for attr in attrs]
-        self.fol_presence = Function(self.fol_func, params=self.named_attr)
+    def constraint(self):
+        if self._constraint is None:
+            self._constraint = Implies(self.constraint_presence,
+                                       And([type_constraint(value) for type_constraint, value in
+                                            zip(type_constraints, self.named_attr)]))
+        return self._constraint
+
+    def fol_func(self):
+        return Symbol(action_name, fol_function)
+
+    def fol_presence(self):
+        if self._fol_presence is None:
+            self._fol_presence = Function(self.fol_func, params=self.named_attr)
+        return self._fol_presence
 
     def under_constraint(self):
         assert self.under_encoded >= 0
@@ -508,6 +530,18 @@ def create_action(action_name, attributes, constraint_dict, sub_actions=None, de
                 time_s = "{action_name}".format(action_name=action_name)
             return time_s + pars
 
+    def get_record_dict(self, model, mask=None):
+        # typed counterpart of get_record, for structured (JSON) trace output
+        attrs = {}
+        for attr, attr_type in attributes:
+            if attr == "time":
+                continue
+            attrs[attr] = _json_value(get_masked_value(mask, attr_type, model.get_py_value(getattr(self, attr))))
+        return {"time": model.get_py_value(self.time) if hasattr(self, "time") else None,
+                "kind": action_name,
+                "attributes": attrs,
+                "present": bool(model.get_py_value(self.presence))}
+
     def model_equal(self, model, other):
         if model.get_py_value(self.presence) != model.get_py_value(other.presence):
             return False
@@ -541,7 +575,7 @@ def create_action(action_name, attributes, constraint_dict, sub_actions=None, de
                                                                   action_name=action_name)
         return time_s + pars
 
-    action_class = type(action_name, (Action,), {
+    class_dict = {
         "action_name": action_name,
         "args_to_type": args_to_type,
         "index_map": index_map,
@@ -560,6 +594,9 @@ def create_action(action_name, attributes, constraint_dict, sub_actions=None, de
         "EQ_CLASS": [OrderedSet()],
         "Uncollected": OrderedSet(),
         "__init__": __init__,
+        "constraint": property(constraint),
+        "fol_func": property(fol_func),
+        "fol_presence": property(fol_presence),
         "get_index_update": get_index_update,
         "make_permanent": make_permanent,
         "sync_time": sync_time,
@@ -572,6 +609,7 @@ def create_action(action_name, attributes, constraint_dict, sub_actions=None, de
         "model_projection": model_projection,
         "extract_mentioned_attributes": extract_mentioned_attributes,
         "get_record": get_record,
+        "get_record_dict": get_record_dict,
         "get_model_record": get_model_record,
         "build_eq_constraint": build_eq_constraint,
         "model_equal": model_equal,
@@ -579,7 +617,19 @@ def create_action(action_name, attributes, constraint_dict, sub_actions=None, de
         "inv": [],
         "threshold": 5,
         "increase_ratio": 10
-    })
+    }
+    # instances are created by the thousands, keep them to fixed slots: the attributes, the sub actions,
+    # the defined values and the bookkeeping above
+    slots = OrderedSet(attr_order + sub_action_names)
+    slots.update(name.split('.')[0] for name, _ in (defines or []))
+    slots.update(["delayed_constraint", "under_encoded", "under_var", "min_var", "print_name", "named_attr",
+                  "constraint_presence", "_constraint", "_fol_presence"])
+    clashes = [name for name in slots if name in class_dict]
+    if clashes:
+        # an attribute shadowing a class level name cannot be a slot, fall back to an instance dict
+        slots = [name for name in slots if name not in class_dict] + ["__dict__"]
+    class_dict["__slots__"] = tuple(slots)
+    action_class = type(action_name, (Action,), class_dict)
     return action_class
 
 
@@ -604,3 +654,14 @@ def get_masked_value(mask, type, value):
                 return type_mask[value]
 
     return value
+
+
+def _json_value(value):
+    # reals come back from the model as Fractions
+    if isinstance(value, Fraction):
+        return int(value) if value.denominator == 1 else float(value)
+    return value
+
+
+register_state(sys.modules[__name__], ["request_action_map", "attribute_variable_map", "exception_map",
+                                       "Delayed_Constraints", "Timed_dict"])
@@ -0,0 +1,177 @@
+import z3
+from pysmt.constants import Fraction, Integer
+from pysmt.exceptions import SolverReturnedUnknownResultError, UndefinedSymbolError
+from pysmt.logics import get_closer_logic
+from pysmt.shortcuts import Solver, get_env
+from pysmt.solvers.solver import Model
+from pysmt.solvers.z3 import Z3Solver, Z3Model
+
+'''
+The solvers behind check_property_refining. Formulas are still built (and recorded in proofs) as pysmt terms;
+"pysmt" hands them to pysmt's z3 solver as they are, "native" keeps the boundary with z3 itself:
+terms are converted once through the solver's memoized converter, assertions are not tracked,
+assumptions are passed as z3 literals and models are read with the z3 API, values as python values
+'''
+
+
+def z3_value(ctx, ast):
+    # python value (as pysmt would give it) of a z3 value, None if it is not a constant of a supported sort
+    decided = z3.Z3_get_bool_value(ctx, ast)
+    if decided == z3.Z3_L_TRUE:
+        return True
+    if decided == z3.Z3_L_FALSE:
+        return False
+    if z3.Z3_is_numeral_ast(ctx, ast):
+        kind = z3.Z3_get_sort_kind(ctx, z3.Z3_get_sort(ctx, ast))
+        if kind == z3.Z3_INT_SORT:
+            return Integer(int(z3.Z3_get_numeral_string(ctx, ast)))
+        if kind == z3.Z3_REAL_SORT:
+            return Fraction(z3.Z3_get_numeral_string(ctx, ast))
+        return None
+    if z3.Z3_is_string(ctx, ast):
+        return z3.Z3_get_string(ctx, ast)
+    return None
+
+
+def assignment(z3_model, symbols=None):
+    '''
+    the values of the constants z3_model assigns, by pysmt symbol; symbols caches the symbol of each name
+    (None for the ones z3 made up) across models
+    '''
+    mgr = get_env().formula_manager
+    if symbols is None:
+        symbols = dict()
+    ctx = z3_model.ctx.ref()
+    m = z3_model.model
+    values = dict()
+    for i in range(z3.Z3_model_get_num_consts(ctx, m)):
+        decl = z3.Z3_model_get_const_decl(ctx, m, i)
+        name = z3.Z3_get_symbol_string(ctx, z3.Z3_get_decl_name(ctx, decl))
+        if name in symbols:
+            symbol = symbols[name]
+        else:
+            try:
+                symbol = mgr.get_symbol(name)
+            except UndefinedSymbolError:
+                symbol = None
+            symbols[name] = symbol
+        if symbol is None:
+            continue
+        interp = z3.Z3_model_get_const_interp(ctx, m, decl)
+        if interp:
+            values[symbol] = z3_value(ctx, interp)
+    return values
+
+
+class NativeModel(Z3Model):
+    '''
+    a z3 model sharing the converter of the solver it came from, so a term is converted once per solver
+    rather than once per model; the assignment is read once and the values of terms are kept
+    '''
+
+    def __init__(self, solver, z3_model):
+        Model.__init__(self, solver.environment)
+        self.z3_model = z3_model
+        self.converter = solver.converter
+        self.solver = solver
+        self.values = None
+        self.evaluated = dict()
+
+    def assignment(self):
+        if self.values is None:
+            self.values = assignment(self.z3_model, self.solver.symbols)
+        return self.values
+
+    def get_py_value(self, formula, model_completion=True):
+        if formula.is_symbol():
+            value = self.assignment().get(formula)
+            if value is not None:
+                return value
+        value = self.evaluated.get(formula)
+        if value is None:
+            res = self.z3_model.eval(self.solver.native(formula), model_completion=model_completion)
+            value = z3_value(res.ctx_ref(), res.as_ast())
+            if value is None:
+                value = Z3Model.get_value(self, formula, model_completion).constant_value()
+            self.evaluated[formula] = value
+        return value
+
+    def equalities(self):
+        # the assignment as z3 equalities, to fix the model in another solver
+        ctx = self.z3_model.ctx
+        self.assignment()
+        res = []
+        for d in self.z3_model.decls():
+            if d.arity() == 0 and self.solver.symbols.get(d.name()) is not None:
+                res.append(equality(d(), self.z3_model.get_interp(d)))
+        return z3.And(res) if res else z3.BoolVal(True, ctx)
+
+
+def equality(lhs, rhs):
+    # lhs = rhs in this order (== on z3 terms lets a numeral on the right take the left)
+    return z3.BoolRef(z3.Z3_mk_eq(lhs.ctx_ref(), lhs.as_ast(), rhs.as_ast()), lhs.ctx)
+
+
+class NativeZ3Solver(Z3Solver):
+
+    def __init__(self, environment, logic, **options):
+        Z3Solver.__init__(self, environment, logic, **options)
+        # symbol of each name met in a model, and z3 terms of the literals (the assumptions of every solve)
+        self.symbols = dict()
+        self.literals = dict()
+
+    def native(self, formula):
+        term = self.literals.get(formula)
+        if term is None:
+            # the converter memoizes the subterms, only the new part of a formula is walked
+            term = self.converter.convert(formula)
+            if formula.is_literal():
+                self.literals[formula] = term
+        return term
+
+    def add_assertion(self, formula, named=None):
+        if self.pending_pop:
+            self.pending_pop = False
+            self.pop()
+        self.z3.add(self.native(formula))
+        self._last_command = "assert"
+
+    def add_model(self, model):
+        # fix the symbols of a model (of any solver) to their values
+        if isinstance(model, NativeModel):
+            self.z3.add(model.equalities())
+        else:
+            for k, v in model:
+                self.z3.add(equality(self.native(k), self.native(v)))
+        self._last_command = "assert"
+
+    def _solve(self, assumptions=None):
+        if assumptions is None:
+            return Z3Solver._solve(self)
+        literals = []
+        for a in assumptions:
+            if not a.is_literal():
+                return Z3Solver._solve(self, assumptions)
+            literals.append(self.native(a))
+        if self.pending_pop:
+            self.pending_pop = False
+            self.pop()
+        res = self.z3.check(*literals)
+        if res == z3.unknown:
+            raise SolverReturnedUnknownResultError
+        return res == z3.sat
+
+    def get_model(self):
+        return NativeModel(self, self.z3.model())
+
+
+def new_solver(backend="pysmt", **options):
+    # a z3 solver of the backend; unsat core tracking is left to pysmt
+    if backend == "pysmt" or options.get("unsat_cores_mode") is not None:
+        return Solver("z3", **options)
+    env = get_env()
+    # the logic pysmt's factory settles on for z3
+    return NativeZ3Solver(env, get_closer_logic(Z3Solver.LOGICS, env.factory.default_logic), **options)
+
+
+SOLVER_BACKENDS = ["pysmt", "native"]
@@ -3,10 +3,11 @@ import time
 
 import derivation_rule
 from analyzer import check_property_refining, clear_all
+from phase_profiler import PhaseProfiler
 from logic_operator import *
 from proof_reader import check_and_minimize
 from sleecOp import EventRelation
-from sleecParser import isXinstance, read_model_file, mm, parse_definitions, constants, scalar_type, reset_rules, \
+from sleecParser import isXinstance, read_model_file, get_metamodel, parse_definitions, constants, scalar_type, reset_rules, \
     parse_rules, parse_concerns, get_high_light, find_relative_pos, registered_type, scalar_mask, parse_relations, \
     get_relational_constraints, clear_relational_constraints
 from pysmt.shortcuts import *
@@ -773,7 +774,7 @@ def parse_sleec_norm(model_file, read_file=True):
     else:
         model_str = model_file
     # Parse the model using the metamodel
-    model = mm.model_from_str(model_str)
+    model = get_metamodel().model_from_str(model_str)
     Action_Mapping = parse_definitions(model.definitions)
     Actions = list(Action_Mapping.values())
 
@@ -1171,6 +1172,9 @@ def check_situational_conflict(model_str, multi_entry=False, profiling = False):
         profiling_file = open("profiling_sconflict.csv", 'w')
         profiling_file.write(
             "raw_finish_time, proof_generation_time, proof_checking_time, raw_proof_size, raw_derivation_steps, trimmed_proof_size, trimmed_derivation_steps\n")
+        profiler = PhaseProfiler()
+    else:
+        profiler = None
 
     for r in rules:
         c_measure = Measure()
@@ -1218,34 +1222,9 @@ def check_situational_conflict(model_str, multi_entry=False, profiling = False):
             target_rule = og_rules[rule_number]
 
             if profiling:
-                # we want to measure the raw analysis time
-                raw_start_time = time.time()
-                check_property_refining(AND(target_rule.get_premise(), AND(AND(inst_actions), measure_inv)), [],
-                                        [r.get_rule() for r in og_rules] + get_relational_constraints(relations),
-                                        Actions, [], True,
-                                        min_solution=False,
-                                        final_min_solution=True, restart=False, boundary_case=False,
-                                        universal_blocking=False,
-                                        record_proof=False)
-                raw_finish_time = time.time() - raw_start_time
-                # inst_actions, trace = model_based_inst(sat_model, Actions, completeness=True, time=c_measure.time,
-                #                                 measure_class=Measure)
-
-                [r.clear() for r in inst_actions]
-                clear_all(Actions)
-                reset_rules(og_rules)
-                measure_inv.clear()
-                derivation_rule.reset()
-                clear_relational_constraints(relations_constraints)
-                clear_relational_constraints(relations)
-
-                target_rule.get_premise().clear()
-                reset_rules(og_rules)
-                measure_inv.clear()
-                derivation_rule.reset()
-
-
-            if profiling:
+                profiler.check = "rule_{}".format(rule_number + 1)
+                # several normalized rules share the check name of their rule, only this call's proof time counts
+                proof_time_before = profiler.total("proof", check=profiler.check)
                 proof_generation_start_time = time.time()
 
             res = check_property_refining(AND(target_rule.get_premise(), AND(AND(inst_actions), measure_inv)), [],
@@ -1254,9 +1233,12 @@ def check_situational_conflict(model_str, multi_entry=False, profiling = False):
                                           min_solution=False,
                                           final_min_solution=True, restart=False, boundary_case=False,
                                           universal_blocking=False,
-                                          record_proof=True)
+                                          record_proof=True, profiler=profiler)
             if profiling:
                 proof_generation_time = time.time() - proof_generation_start_time
+                # the raw analysis time is what remains once the proof writing is taken out
+                raw_finish_time = proof_generation_time - (profiler.total("proof", check=profiler.check) -
+                                                           proof_time_before)
 
             if profiling:
                 proof_checking_time = 0
@@ -1389,6 +1371,7 @@ def check_situational_conflict(model_str, multi_entry=False, profiling = False):
 
     if profiling:
         profiling_file.close()
+        profiler.export("profiling_sconflict")
 
     if multi_entry:
         return multi_output
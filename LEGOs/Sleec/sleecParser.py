@@ -1,29 +1,161 @@
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import multiprocessing
 import os.path
+import queue
+import sys
+import tempfile
+import threading
 import time
 
 from pysmt.fnode import FNode
 from termcolor import colored
 
-from analyzer import check_property_refining, clear_all, log_fol_formula
+from analyzer import check_property_refining, clear_all, log_fol_formula, IncrementalSession, \
+    set_refining_strategy, RefiningCancelled, Budget, BudgetExceeded, start_budget, set_solver_backend, SOLVER_BACKENDS
+from analysis_context import AnalysisContext, register_state
+from phase_profiler import PhaseProfiler
+from trace_ult import trace_records
 from proof_reader import check_and_minimize
 from type_constructor import create_type, create_action, union
 from sleecOp import WhenRule, happen_within, otherwise, unless, complie_measure, Concern, EventRelation, \
     MeasureRelation, Causation, Effect, UntilEMRelation, TimedEMRelation
 from logic_operator import *
+import analyzer
+import logic_operator
 import derivation_rule
 from proof_reader import Fact
 
-from textx import metamodel_from_file, textx_isinstance
+from textx import get_children_of_type, metamodel_from_file, textx_isinstance
 
-grammar_file = "sleec-gramar.tx"
-mm = metamodel_from_file(grammar_file)
+grammar_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sleec-gramar.tx")
+_mm = None
+_mm_lock = threading.Lock()
 constants = {}
 
 VOL_BOUND = 20
+# the bounds (multiples of VOL_BOUND) a check escalates to after a bounded UNSAT, adding the first/last event
+# axioms; with deepening the live check raises its bound, otherwise each bound is checked again from scratch
+VOL_BOUND_SCHEDULE = [5]
+DEEPENING = True
+
+
+def set_vol_bound_schedule(schedule=None, deepening=True):
+    global VOL_BOUND_SCHEDULE, DEEPENING
+    VOL_BOUND_SCHEDULE = list(schedule) if schedule is not None else [5]
+    DEEPENING = deepening
+
+
+def deepening_stages(first_inv):
+    # the stages handed to check_property_refining (None when the bounds are checked from scratch)
+    if not DEEPENING:
+        return None
+    return [(VOL_BOUND * factor, first_inv) for factor in VOL_BOUND_SCHEDULE]
+
+
+def restart_schedule():
+    # the bounds checked again from scratch after a bounded UNSAT
+    return [] if DEEPENING else VOL_BOUND_SCHEDULE
+
+
+# redundancy/conflict checks only get the rules and relations in the cone of influence of the rule checked
+SLICING = True
+
+
+def set_slicing(enabled=True):
+    global SLICING
+    SLICING = enabled
+
+
+# the engine of the redundancy/conflict checks: "refining" (the CEGAR loop), "fol" (z3 on the quantified
+# encoding, see check_property_quantified) or "auto", racing the two on every check unless the statistics in
+# ENGINE_STATS show one of them winning (nearly) every check of the spec
+ENGINES = ["refining", "fol", "auto"]
+ENGINE = "refining"
+ENGINE_STATS = None
+ENGINE_PORTFOLIO = [{"name": "refining"}, {"name": "fol", "engine": "fol"}]
+# the share of the recorded checks of a spec an engine has to win to be picked up front
+ENGINE_PICK_SHARE = 0.9
+
+
+def set_engine(engine="refining", stats_file=None):
+    global ENGINE, ENGINE_STATS
+    ENGINE = engine
+    ENGINE_STATS = stats_file
+
+
+def spec_key(analysis, spec):
+    return "{}:{}".format(analysis, hashlib.sha1(spec.encode()).hexdigest())
+
+
+def load_engine_stats(stats_file):
+    if not stats_file or not os.path.exists(stats_file):
+        return dict()
+    with open(stats_file) as f:
+        return json.load(f)
+
+
+def select_engine(analysis, spec):
+    # ENGINE, or for "auto" the engine that won enough of the checks recorded for spec in ENGINE_STATS
+    if ENGINE != "auto":
+        return ENGINE
+    record = load_engine_stats(ENGINE_STATS).get(spec_key(analysis, spec))
+    if record is not None:
+        checks = sum(stats["wins"] for stats in record["engines"].values())
+        for engine, stats in record["engines"].items():
+            if checks and stats["wins"] >= ENGINE_PICK_SHARE * checks:
+                print("engine: {} (won {} of {} checks over {} runs)".format(engine, stats["wins"], checks,
+                                                                            record["runs"]))
+                return engine
+    print("engine: racing {}".format(" and ".join(c["name"] for c in ENGINE_PORTFOLIO)))
+    return "auto"
+
+
+def engine_portfolio(analysis, spec, portfolio):
+    # the portfolio the checks are run with on the selected engine (None: in process, on the CEGAR loop),
+    # and the statistics file the race is recorded in (None when the engine was picked)
+    engine = select_engine(analysis, spec)
+    if engine == "refining":
+        return portfolio, None
+    fol = [c for c in ENGINE_PORTFOLIO if c.get("engine") == "fol"]
+    if engine == "fol":
+        return fol, None
+    return (ENGINE_PORTFOLIO[:1] if portfolio is None else portfolio) + fol, ENGINE_STATS
+
+
+def record_engine_stats(stats_file, analysis, spec, portfolio, wins):
+    # adds the checks won by every engine in a race (answered ones only) to the statistics of spec
+    stats = load_engine_stats(stats_file)
+    record = stats.setdefault(spec_key(analysis, spec), {"runs": 0, "engines": dict()})
+    record["runs"] += 1
+    engines = dict([(c["name"], c.get("engine", "refining")) for c in portfolio])
+    for engine in set(engines.values()):
+        record["engines"].setdefault(engine, {"wins": 0, "seconds": 0.0})
+    for win in wins:
+        if win["unknown"]:
+            continue
+        won = record["engines"][engines[win["config"]]]
+        won["wins"] += 1
+        won["seconds"] = round(won["seconds"] + win["seconds"], 3)
+    with open(stats_file, 'w') as f:
+        json.dump(stats, f, indent=2)
+
+
+def get_metamodel():
+    # build the textX metamodel on first use, once per process, independent of cwd
+    global _mm
+    if _mm is None:
+        with _mm_lock:
+            if _mm is None:
+                _mm = metamodel_from_file(grammar_file)
+    return _mm
 
 
 def isXinstance(obj, cls):
-    return textx_isinstance(obj, mm[cls])
+    return textx_isinstance(obj, get_metamodel()[cls])
 
 
 def read_model_file(file_path):
@@ -50,6 +182,7 @@ def match_default_sleec_data_type(typename):
 scalar_type = {}
 scalar_mask = {}
 registered_type = set()
+register_state(sys.modules[__name__], ["constants", "scalar_type", "scalar_mask", "registered_type"])
 
 
 def add_scale(scalePaarams):
@@ -621,7 +754,7 @@ def parse_negation(node, Action_Mapping, head, measure, is_pos):
 
 
 def check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, model_str="", to_print=True,
-                   multi_entry=False, log_z3 = ""):
+                   multi_entry=False, log_z3 = "", indices=None, profiling=False):
     Measure = Action_Mapping["Measure"]
     first_inv = [Implication(exist(E, lambda _: TRUE()),
                              AND(
@@ -638,11 +771,16 @@ def check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, m
     adj_hl = []
     concern_raised = False
     relations_constraint = get_relational_constraints(relations)
+    profiler = PhaseProfiler() if profiling else None
     for i in range(len(concerns)):
+        if indices is not None and i not in indices:
+            continue
         if to_print:
             print("check concern_{}".format(i + 1))
         else:
             output += "check concern_{}\n".format(i + 1)
+        if profiling:
+            profiler.check = "concern_{}".format(i + 1)
 
         concern = concerns[i]
         if log_z3:
@@ -662,10 +800,12 @@ def check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, m
                                       Actions, [], True,
                                       min_solution=False,
                                       final_min_solution=True, restart=False, boundary_case=False,
-                                      universal_blocking=False, vol_bound=VOL_BOUND, scalar_mask=scalar_mask
-                                      )
+                                      universal_blocking=False, vol_bound=VOL_BOUND, scalar_mask=scalar_mask,
+                                      profiler=profiler, deepening=deepening_stages(first_inv))
 
-        if res == 2:
+        for factor in restart_schedule():
+            if res != 2:
+                break
             concern.get_concern().clear()
             clear_all(Actions)
             reset_rules(rules)
@@ -680,8 +820,8 @@ def check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, m
                                           Actions, [], True,
                                           min_solution=False,
                                           final_min_solution=True, restart=False, boundary_case=False,
-                                          universal_blocking=False, vol_bound=VOL_BOUND * 5,
-                                          record_proof=False)
+                                          universal_blocking=False, vol_bound=VOL_BOUND * factor,
+                                          record_proof=False, profiler=profiler)
 
         if isinstance(res, str):
             concern_raised = True
@@ -712,11 +852,14 @@ def check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, m
         derivation_rule.reset()
         print("*" * 100)
         output += "*" * 100 + '\n'
+    if profiling:
+        profiler.export("profiling_concern")
     return concern_raised, output, adj_hl
 
 
 
-def get_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, target_rule_ids, model_str="", to_print=True, multi_entry=False, bound_time =20):
+def get_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, target_rule_ids, model_str="", to_print=True, multi_entry=False, bound_time =20,
+                          records=None, profiling=False, query_budget=None, analysis_budget=None):
     Measure = Action_Mapping["Measure"]
     first_inv = [Implication(exist(E, lambda _: TRUE()),
                              AND(
@@ -748,6 +891,10 @@ def get_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, targ
             axioms.append(Implication(symbol, premise))
             symbol_to_rule[symbol] = rule
     current_assumptions = set(symbol_to_rule.keys())
+    profiler = PhaseProfiler() if profiling else None
+    if profiling:
+        profiler.check = "max_{}".format(bound_time)
+    budget = start_budget(query_budget, analysis_budget.start() if analysis_budget is not None else None)
     while True:
         assumption_copy = current_assumptions.copy()
         res = check_property_refining(TRUE(), set(first_inv),
@@ -759,7 +906,12 @@ def get_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, targ
                                       final_min_solution=True, restart=False, boundary_case=False,
                                       universal_blocking=False, vol_bound=VOL_BOUND * 5,
                                       assumptions=assumption_copy,
-                                      ret_model=True)
+                                      ret_model=True, profiler=profiler, budget=budget)
+        if profiling:
+            profiler.export("profiling_max")
+        if records is not None and isinstance(res, tuple):
+            # the model refers to the instantiated actions, so read the records before clearing them
+            records.extend(trace_records(res[1], Actions, [], ignore_class=[], scaler_mask=scalar_mask))
         for premise in premises:
             premise.clear()
         clear_all(Actions)
@@ -771,6 +923,9 @@ def get_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, targ
 
         if res == 0:
             return 0
+        elif isinstance(res, BudgetExceeded):
+            print(res)
+            return res
         elif res == 2:
             print("unknown")
             return 2
@@ -788,14 +943,100 @@ def get_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, targ
             return trace_string
 
 
+def sweep_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, target_rule_ids, windows, model_str=""):
+    """
+    get_max_trigger_trace for several trace time windows on one solver. The time bounds of each window
+    are guarded by assumption literals of an IncrementalSession, and the windows are solved from the
+    smallest to the largest: a trace of a window is also a trace of every larger one, so the domain
+    instantiated for the previous window (and its model) seeds the next one.
+    Returns one entry per window with its trace (None if there is none), status, triggered rules and timing.
+    """
+    Measure = Action_Mapping["Measure"]
+    first_inv = [Implication(exist(E, lambda _: TRUE()),
+                             AND(
+                                 exist(E, lambda e_first, E=E: forall(E, lambda e, e_f=e_first:
+                                 e.time >= e_f.time
+                                                                      ), should_include_action=class_non_empty(E)),
+                                 exist(E, lambda e_last, E=E: forall(E, lambda e, e_l=e_last:
+                                 e.time <= e_l.time
+                                                                     ), should_include_action=class_non_empty(E)),
+                             )) for E in Actions if E != Measure]
+    measure_inv = forall([Measure, Measure], lambda m1, m2: Implication(EQ(m1.time, m2.time), EQ(m1, m2)))
+    windows = sorted(set(windows))
+    time_invs = {}
+    for bound_time in windows:
+        time_invs[bound_time] = [forall(Measure, lambda m, t=bound_time: m.time <= t)] + \
+                                [forall(ACT, lambda act, t=bound_time: act.time < t) for ACT in Actions]
+    relations_constraint = get_relational_constraints(relations)
+    # set up assumption literal for premises
+    symbol_to_index = {}
+    axioms = []
+    premises = [r.get_premise() for r in rules]
+    for i in range(len(rules)):
+        if model.ruleBlock.rules[i].name in target_rule_ids:
+            symbol = Symbol("rule_{}".format(i))
+            axioms.append(Implication(symbol, rules[i].get_premise()))
+            symbol_to_index[symbol] = i
+
+    session = IncrementalSession([inv for invs in time_invs.values() for inv in invs])
+    results = []
+    for bound_time in windows:
+        print("time window {}".format(bound_time))
+        start_time = time.time()
+        res = check_property_refining(TRUE(), set(first_inv),
+                                      [r.get_rule() for r in rules] + relations_constraint +
+                                      [measure_inv] + axioms + first_inv + time_invs[bound_time],
+                                      Actions, [], True,
+                                      min_solution=False,
+                                      final_min_solution=True, restart=False, boundary_case=False,
+                                      universal_blocking=False, vol_bound=VOL_BOUND * 5,
+                                      assumptions=set(symbol_to_index.keys()),
+                                      ret_model=True, session=session)
+        entry = {"time_window": bound_time, "trace": None, "records": [], "triggered": [],
+                 "seconds": time.time() - start_time}
+        if res == 0:
+            entry["status"] = "unsat"
+        elif res == 2 or res == -1:
+            print("unknown")
+            entry["status"] = "unknown"
+        else:
+            trace_string, sat_model = res
+            entry["status"] = "sat"
+            entry["trace"] = trace_string
+            entry["records"] = trace_records(sat_model, Actions, [], ignore_class=[], scaler_mask=scalar_mask)
+            print("triggered_rules")
+            for symbol, i in symbol_to_index.items():
+                if sat_model.get_py_value(symbol):
+                    target = model.ruleBlock.rules[i]
+                    start, end = target._tx_position, target._tx_position_end
+                    entry["triggered"].append(target.name)
+                    print(f"{symbol}: {model_str[start: end]}")
+        results.append(entry)
+
+    for premise in premises:
+        premise.clear()
+    clear_all(Actions)
+    reset_rules(rules)
+    clear_relational_constraints(relations)
+    measure_inv.clear()
+    [r.clear() for r in first_inv]
+    [inv.clear() for invs in time_invs.values() for inv in invs]
+    derivation_rule.reset()
+    return results
+
+
 def check_conflict(model, rules, relations, Action_Mapping, Actions, model_str="", check_proof=False, to_print=True,
-                   multi_entry=False, profiling=True, log_z3 = ""):
+                   multi_entry=False, profiling=True, log_z3 = "", indices=None,
+                   conflicting_set=None, query_budget=None, analysis_budget=None):
 
     Measure = Action_Mapping["Measure"]
 
     if profiling:
         profiling_file = open("profiling_conflict.csv", 'w')
         profiling_file.write("raw_finish_time, proof_generation_time, proof_checking_time, raw_proof_size, raw_derivation_steps, trimmed_proof_size, trimmed_derivation_steps\n")
+        profiler = PhaseProfiler()
+    else:
+        profiler = None
 
     first_inv = [Implication(exist(E, lambda _: TRUE()),
                              AND(
@@ -811,11 +1052,16 @@ def check_conflict(model, rules, relations, Action_Mapping, Actions, model_str="
     output = ""
     adj_hl = []
     conflict_res = False
-    conflicting_set = set()
+    if conflicting_set is None:
+        conflicting_set = set()
     relations_constraint = get_relational_constraints(relations)
+    influences = spec_influences(model)
     multi_output = []
 
+    analysis = analysis_budget.start() if analysis_budget is not None else None
     for i in range(len(rules)):
+        if indices is not None and i not in indices:
+            continue
 
         if multi_entry:
             output = ""
@@ -853,39 +1099,27 @@ def check_conflict(model, rules, relations, Action_Mapping, Actions, model_str="
             continue
 
         if profiling:
-            # we want to measure the raw analysis time
-            raw_start_time = time.time()
-            res = check_property_refining(rule.get_premise(), set(),
-                                          [r.get_rule() for r in rules] + relations_constraint + [measure_inv],
-                                          Actions, [], True,
-                                          min_solution=False,
-                                          final_min_solution=True, restart=False, boundary_case=False,
-                                          universal_blocking=False, vol_bound=VOL_BOUND,
-                                          record_proof=check_proof)
-            raw_finish_time = time.time() - raw_start_time
-            rule.get_premise().clear()
-            clear_all(Actions)
-            reset_rules(rules)
-            clear_relational_constraints(relations)
-            measure_inv.clear()
-            [r.clear() for r in first_inv]
-            derivation_rule.reset()
-
-
-        if profiling:
+            profiler.check = "rule_{}".format(i + 1)
             proof_generation_start_time = time.time()
+        budget = start_budget(query_budget, analysis)
+        constraints, origin = sliced_constraints(influences, i, rules, relations_constraint, profiler=profiler)
         res = check_property_refining(rule.get_premise(), set(),
-                                      [r.get_rule() for r in rules] + relations_constraint + [measure_inv],
+                                      constraints + [measure_inv],
                                       Actions, [], True,
                                       min_solution=False,
                                       final_min_solution=True, restart=False, boundary_case=False,
                                       universal_blocking=False, vol_bound=VOL_BOUND,
-                                      record_proof=check_proof)
+                                      record_proof=check_proof, profiler=profiler,
+                                      budget=budget, deepening=deepening_stages(first_inv))
 
         if profiling:
             proof_generation_time = time.time() - proof_generation_start_time
+            # the raw analysis time is what remains once the proof writing is taken out
+            raw_finish_time = proof_generation_time - profiler.total("proof", check=profiler.check)
 
-        if res == 2:
+        for factor in restart_schedule():
+            if res != 2:
+                break
             rule.get_premise().clear()
             clear_all(Actions)
             reset_rules(rules)
@@ -898,14 +1132,13 @@ def check_conflict(model, rules, relations, Action_Mapping, Actions, model_str="
                 proof_generation_start_time = time.time()
 
             res = check_property_refining(rule.get_premise(), set(first_inv),
-                                          [r.get_rule() for r in rules] + relations_constraint +
-                                          [measure_inv] +
-                                          first_inv,
+                                          constraints + [measure_inv] + first_inv,
                                           Actions, [], True,
                                           min_solution=False,
                                           final_min_solution=True, restart=False, boundary_case=False,
-                                          universal_blocking=False, vol_bound=VOL_BOUND * 5,
-                                          record_proof=check_proof)
+                                          universal_blocking=False, vol_bound=VOL_BOUND * factor,
+                                          record_proof=check_proof, profiler=profiler,
+                                          budget=budget)
 
             if profiling:
                 proof_generation_time = time.time() - proof_generation_start_time
@@ -916,6 +1149,15 @@ def check_conflict(model, rules, relations, Action_Mapping, Actions, model_str="
             else:
                 output += "Not Conflicting\n"
 
+        elif isinstance(res, BudgetExceeded):
+            if to_print:
+                print(res)
+            else:
+                output += "{}\n".format(res)
+            if multi_entry:
+                # not a finding, but the editor should not read the rule as checked
+                multi_output.append(("rule_{}: {}\n".format(i + 1, res), []))
+
         elif res == -1:
             if to_print:
                 print("Likely Conflicting")
@@ -969,14 +1211,14 @@ def check_conflict(model, rules, relations, Action_Mapping, Actions, model_str="
                     adjust_index = i
                     conflicting_set.add(adjust_index)
                     rule_model = model.ruleBlock.rules[adjust_index]
-                elif id > len(rules):
-                    if model.relBlock and id - 1 < len(model.relBlock.relations) + len(rules):
-                        adjust_index = id - 1
-                        rule_model = model.relBlock.relations[id - 1 - len(rules)]
-                    else:
-                        continue
+                elif id - 1 >= len(origin):
+                    # measure_inv and first_inv come after the sliced rules and relations
+                    continue
+                elif origin[id - 1] >= len(rules):
+                    adjust_index = origin[id - 1]
+                    rule_model = model.relBlock.relations[adjust_index - len(rules)]
                 else:
-                    adjust_index = id - 1
+                    adjust_index = origin[id - 1]
                     conflicting_set.add(adjust_index)
                     rule_model = model.ruleBlock.rules[adjust_index]
 
@@ -1032,6 +1274,11 @@ def check_conflict(model, rules, relations, Action_Mapping, Actions, model_str="
         [r.clear() for r in first_inv]
         print("*" * 100)
         output += "*" * 100 + '\n'
+
+    if profiling:
+        profiling_file.close()
+        profiler.export("profiling_conflict")
+
     if multi_entry:
         return multi_output
     else:
@@ -1039,7 +1286,7 @@ def check_conflict(model, rules, relations, Action_Mapping, Actions, model_str="
 
 def check_purposes(model, purposes, rules, relations, Action_Mapping, Actions, model_str="", check_proof=False,
                    to_print=True,
-                   multi_entry=False, profiling= True, log_z3 =""):
+                   multi_entry=False, profiling= True, log_z3 ="", indices=None):
     Measure = Action_Mapping["Measure"]
     first_inv = [Implication(exist(E, lambda _: TRUE()),
                              AND(
@@ -1063,8 +1310,13 @@ def check_purposes(model, purposes, rules, relations, Action_Mapping, Actions, m
         profiling_file = open("profiling_purpose.csv", 'w')
         profiling_file.write(
             "raw_finish_time, proof_generation_time, proof_checking_time, raw_proof_size, raw_derivation_steps, trimmed_proof_size, trimmed_derivation_steps\n")
+        profiler = PhaseProfiler()
+    else:
+        profiler = None
 
     for i in range(len(purposes)):
+        if indices is not None and i not in indices:
+            continue
 
         if multi_entry:
             output = ""
@@ -1103,27 +1355,7 @@ def check_purposes(model, purposes, rules, relations, Action_Mapping, Actions, m
             continue
 
         if profiling:
-            # we want to measure the raw analysis time
-            raw_start_time = time.time()
-            check_property_refining(purpose.get_concern(), set(), [r.get_rule() for r in rules] +
-                                    relations_constraint +
-                                    [measure_inv],
-                                    Actions, [], True,
-                                    min_solution=False,
-                                    final_min_solution=True, restart=False, boundary_case=False,
-                                    universal_blocking=False, vol_bound=VOL_BOUND,
-                                    record_proof=False,
-                                    scalar_mask=scalar_mask)
-
-            raw_finish_time = time.time() - raw_start_time
-            purpose.get_concern().clear()
-            clear_all(Actions)
-            reset_rules(rules)
-            clear_relational_constraints(relations)
-            measure_inv.clear()
-            [r.clear() for r in first_inv]
-            derivation_rule.reset()
-        if profiling:
+            profiler.check = "purpose_{}".format(i + 1)
             proof_generation_start_time = time.time()
 
         res = check_property_refining(purpose.get_concern(), set(), [r.get_rule() for r in rules] +
@@ -1134,12 +1366,17 @@ def check_purposes(model, purposes, rules, relations, Action_Mapping, Actions, m
                                       final_min_solution=True, restart=False, boundary_case=False,
                                       universal_blocking=False, vol_bound=VOL_BOUND,
                                       record_proof=check_proof,
-                                      scalar_mask=scalar_mask)
+                                      scalar_mask=scalar_mask, profiler=profiler,
+                                      deepening=deepening_stages(first_inv))
 
         if profiling:
             proof_generation_time = time.time() - proof_generation_start_time
+            # the raw analysis time is what remains once the proof writing is taken out
+            raw_finish_time = proof_generation_time - profiler.total("proof", check=profiler.check)
 
-        if res == 2:
+        for factor in restart_schedule():
+            if res != 2:
+                break
             purpose.get_concern().clear()
             clear_all(Actions)
             reset_rules(rules)
@@ -1158,8 +1395,8 @@ def check_purposes(model, purposes, rules, relations, Action_Mapping, Actions, m
                                           Actions, [], True,
                                           min_solution=False,
                                           final_min_solution=True, restart=False, boundary_case=False,
-                                          universal_blocking=False, vol_bound=VOL_BOUND * 5,
-                                          record_proof=check_proof)
+                                          universal_blocking=False, vol_bound=VOL_BOUND * factor,
+                                          record_proof=check_proof, profiler=profiler)
 
             if profiling:
                 proof_generation_time = time.time() - proof_generation_start_time
@@ -1294,6 +1531,7 @@ def check_purposes(model, purposes, rules, relations, Action_Mapping, Actions, m
 
     if profiling:
         profiling_file.close()
+        profiler.export("profiling_purpose")
 
     if multi_entry:
         return multi_output
@@ -1314,6 +1552,96 @@ def clear_relational_constraints(relations):
         r.clear()
 
 
+def influence(node):
+    '''
+    the gates and the events of a rule or relation (textX node): it holds on every trace in which the events of
+    none of its gates occur (an empty gate: it constrains every trace), and the events it mentions are all it can
+    bring about
+    '''
+    events = set(t.event.name for t in get_children_of_type("Trigger", node))
+    for attr in ("lhs", "rhs", "cause"):
+        ref = getattr(node, attr, None)
+        if isXinstance(ref, "Event"):
+            events.add(ref.name)
+    if isXinstance(node, "Rule"):
+        return [{node.trigger.event.name}], events
+    if isXinstance(node, "EventRel"):
+        lhs, rhs = node.lhs.name, node.rhs.name
+        gates = {"witness": [{lhs}], "happenBefore": [{rhs}], "mutualExclusive": [{lhs, rhs}]}
+        return gates.get(node.rel, [{lhs}, {rhs}]), events
+    if isXinstance(node, "Effect") or isXinstance(node, "Forbid"):
+        return [{node.cause.name}], events
+    if isXinstance(node, "EMRelation"):
+        return [{node.start_trigger.event.name}], events
+    # causations and measure relations constrain every measure state
+    return [set()], events
+
+
+def spec_influences(model):
+    # the influence of every rule and then every relation of model, None when slicing is off
+    if not SLICING:
+        return None
+    nodes = list(model.ruleBlock.rules)
+    if model.relBlock:
+        nodes += list(model.relBlock.relations)
+    return [influence(node) for node in nodes]
+
+
+def cone_of_influence(influences, seeds):
+    '''
+    the indices of the rules/relations (by influences) a check on the events seeds depends on: walking the
+    event graph from seeds, an element is taken once the events of one of its gates are reached, and its events
+    are reached in turn. On a trace of the taken ones, dropping the occurrences of the events never reached
+    leaves a trace of all of them, so a check can leave the others out and keep its answer
+    '''
+    watchers = dict()
+    kept = set()
+    reached = set()
+    pending = list(seeds)
+    for j, (gates, events) in enumerate(influences):
+        if not all(gates):
+            kept.add(j)
+            pending.extend(events)
+        for gate in gates:
+            for event in gate:
+                watchers.setdefault(event, []).append(j)
+    while pending:
+        event = pending.pop()
+        if event in reached:
+            continue
+        reached.add(event)
+        for j in watchers.get(event, []):
+            gates, events = influences[j]
+            if j not in kept and any(gate <= reached for gate in gates):
+                kept.add(j)
+                pending.extend(events)
+    return kept
+
+
+def sliced_constraints(influences, i, rules, relations_constraint, others_only=False, profiler=None):
+    '''
+    the rules (but rule i when others_only) and relation constraints in the cone of influence of rule i, and the
+    index of each among the rules and then the relations (what the ids of an UNSAT core are mapped back through).
+    The size of the slice is recorded as a "slice" phase of the profiler
+    '''
+    count = len(rules) + len(relations_constraint)
+    if influences is None:
+        kept = list(range(count))
+    else:
+        kept = sorted(cone_of_influence(influences, influences[i][1]))
+    if others_only:
+        kept = [j for j in kept if j != i]
+        count -= 1
+    if profiler is not None and influences is not None:
+        # the check starts in its first round, the slice is counted with it
+        profiler.round = 1
+        with profiler.phase("slice", kept=len(kept), total=count):
+            pass
+    constraints = ([rules[j].get_rule() for j in kept if j < len(rules)] +
+                   [relations_constraint[j - len(rules)] for j in kept if j >= len(rules)])
+    return constraints, kept
+
+
 def get_measure_inv(Measure, Actions):
     pure_actions = [act for act in Actions if act != Measure]
     return AND(forall([Measure, Measure], lambda m1, m2: Implication(EQ(m1.time, m2.time), EQ(m1, m2))),
@@ -1321,7 +1649,8 @@ def get_measure_inv(Measure, Actions):
 
 
 def check_red(model, rules, relations, Action_Mapping, Actions, model_str="", check_proof=False, to_print=True,
-              multi_entry=False, profiling=False, log_z3=""):
+              multi_entry=False, profiling=False, log_z3="", indices=None,
+              query_budget=None, analysis_budget=None):
 
     Measure = Action_Mapping["Measure"]
     measure_inv = forall([Measure, Measure], lambda m1, m2: Implication(EQ(m1.time, m2.time), EQ(m1, m2)))
@@ -1341,10 +1670,17 @@ def check_red(model, rules, relations, Action_Mapping, Actions, model_str="", ch
     adj_hl = []
     red_result = False
     relations_constraint = get_relational_constraints(relations)
+    influences = spec_influences(model)
     if profiling:
         profiling_file = open("profiling_red.csv", 'w')
         profiling_file.write("raw_finish_time, proof_generation_time, proof_checking_time, raw_proof_size, raw_derivation_steps, trimmed_proof_size, trimmed_derivation_steps\n")
+        profiler = PhaseProfiler()
+    else:
+        profiler = None
+    analysis = analysis_budget.start() if analysis_budget is not None else None
     for i in range(len(rules)):
+        if indices is not None and i not in indices:
+            continue
 
         if multi_entry:
             output = ""
@@ -1373,41 +1709,28 @@ def check_red(model, rules, relations, Action_Mapping, Actions, model_str="", ch
             continue
 
         if profiling:
-            # we want to measure the raw analysis time
-            raw_start_time = time.time()
-            check_property_refining(rule.get_neg_rule(), set(),
-                                    [r.get_rule() for r in others] + relations_constraint +
-                                    [measure_inv],
-                                    Actions, [], True,
-                                    min_solution=False,
-                                    final_min_solution=True, restart=False, boundary_case=False,
-                                    universal_blocking=False, vol_bound=VOL_BOUND,
-                                    record_proof=None)
-
-            raw_finish_time = time.time() - raw_start_time
-            rule.get_neg_rule().clear()
-            clear_all(Actions)
-            reset_rules(rules)
-            clear_relational_constraints(relations)
-            measure_inv.clear()
-            [r.clear() for r in first_inv]
-            derivation_rule.reset()
-
-        if profiling:
+            profiler.check = "rule_{}".format(i + 1)
             proof_generation_start_time = time.time()
 
+        budget = start_budget(query_budget, analysis)
+        constraints, origin = sliced_constraints(influences, i, rules, relations_constraint, others_only=True,
+                                                 profiler=profiler)
         res = check_property_refining(rule.get_neg_rule(), set(),
-                                      [r.get_rule() for r in others] + relations_constraint +
-                                      [measure_inv],
+                                      constraints + [measure_inv],
                                       Actions, [], True,
                                       min_solution=False,
                                       final_min_solution=True, restart=False, boundary_case=False,
                                       universal_blocking=False, vol_bound=VOL_BOUND,
-                                      record_proof=check_proof)
+                                      record_proof=check_proof, profiler=profiler,
+                                      budget=budget, deepening=deepening_stages(first_inv))
         if profiling:
             proof_generation_time = time.time() - proof_generation_start_time
+            # the raw analysis time is what remains once the proof writing is taken out
+            raw_finish_time = proof_generation_time - profiler.total("proof", check=profiler.check)
 
-        if res == 2:
+        for factor in restart_schedule():
+            if res != 2:
+                break
             rule.get_neg_rule().clear()
             clear_all(Actions)
             reset_rules(rules)
@@ -1419,14 +1742,13 @@ def check_red(model, rules, relations, Action_Mapping, Actions, model_str="", ch
             if profiling:
                 proof_generation_start_time = time.time()
             res = check_property_refining(rule.get_neg_rule(), set(first_inv),
-                                          [r.get_rule() for r in others] + relations_constraint +
-                                          [measure_inv] +
-                                          first_inv,
+                                          constraints + [measure_inv] + first_inv,
                                           Actions, [], True,
                                           min_solution=False,
                                           final_min_solution=True, restart=False, boundary_case=False,
-                                          universal_blocking=False, vol_bound=VOL_BOUND * 5,
-                                          record_proof=check_proof)
+                                          universal_blocking=False, vol_bound=VOL_BOUND * factor,
+                                          record_proof=check_proof, profiler=profiler,
+                                          budget=budget)
 
             if profiling:
                 proof_generation_time = time.time() - proof_generation_start_time
@@ -1437,6 +1759,15 @@ def check_red(model, rules, relations, Action_Mapping, Actions, model_str="", ch
             else:
                 output += "Not Redundant\n"
 
+        elif isinstance(res, BudgetExceeded):
+            if to_print:
+                print(res)
+            else:
+                output += "{}\n".format(res)
+            if multi_entry:
+                # not a finding, but the editor should not read the rule as checked
+                multi_output.append(("rule_{}: {}\n".format(i + 1, res), []))
+
         elif res == 2:
             if to_print:
                 print("Likely Redundant")
@@ -1492,17 +1823,15 @@ def check_red(model, rules, relations, Action_Mapping, Actions, model_str="", ch
                 id = r.id
                 if id == 0:
                     id = i
-                elif id <= i:
-                    id = id - 1
+                elif id - 1 >= len(origin):
+                    # measure_inv and first_inv come after the sliced rules and relations
+                    continue
                 else:
-                    pass
+                    id = origin[id - 1]
 
                 if id >= len(rules):
                     adjust_index = id
-                    if model.relBlock and id - len(rules) < len(model.relBlock.relations):
-                        rule_model = model.relBlock.relations[id - len(rules)]
-                    else:
-                        continue
+                    rule_model = model.relBlock.relations[id - len(rules)]
                 else:
                     adjust_index = id
                     rule_model = model.ruleBlock.rules[adjust_index]
@@ -1564,6 +1893,7 @@ def check_red(model, rules, relations, Action_Mapping, Actions, model_str="", ch
 
     if profiling:
         profiling_file.close()
+        profiler.export("profiling_red")
 
     if multi_entry:
         return multi_output
@@ -1608,7 +1938,7 @@ def parse_sleec(model_file, read_file=True):
     else:
         model_str = model_file
     # Parse the model using the metamodel
-    model = mm.model_from_str(model_str)
+    model = get_metamodel().model_from_str(model_str)
     Action_Mapping = parse_definitions(model.definitions)
     Actions = list(Action_Mapping.values())
     rules = parse_rules(model.ruleBlock, Action_Mapping)
@@ -1634,10 +1964,312 @@ def parse_sleec(model_file, read_file=True):
 # model_str = read_model_file("dressingrobot.sleec")
 # check_red(model, rules, Action_Mapping, Actions, check_proof=True, model_str=model_str)
 
-def check_input_red(model_str, multi_entry=False):
-    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(model_str, read_file=False)
-    res = check_red(model, rules, relations, Action_Mapping, Actions, check_proof=True, model_str=model_str,
-                    multi_entry=multi_entry)
+PROFILING_FILES = {"redundancy": "profiling_red.csv", "conflict": "profiling_conflict.csv",
+                   "purpose": "profiling_purpose.csv"}
+PROFILING_HEADER = "raw_finish_time, proof_generation_time, proof_checking_time, raw_proof_size, raw_derivation_steps, trimmed_proof_size, trimmed_derivation_steps\n"
+PROFILING_DEFAULTS = {"redundancy": False, "conflict": True, "concern": False, "purpose": True}
+
+_shard = {}
+
+
+def replay_conflicting_set(discovered, upto):
+    """
+    replay how check_conflict grows conflicting_set over the rules before upto,
+    None if one of those rules has not been checked yet
+    """
+    conflicting_set = set()
+    for j in range(upto):
+        if j not in discovered:
+            return None
+        if not skip_conflicting(conflicting_set, j):
+            conflicting_set.update(discovered[j])
+    return conflicting_set
+
+
+def skip_conflicting(conflicting_set, i):
+    return i in conflicting_set and len(conflicting_set) <= 2
+
+
+def _init_analysis_worker(spec, work_root, discovered):
+    # the encoder state is process global, so every worker parses its own copy of the specification,
+    # and works in a private directory so that proof.txt and the profiling csv files do not collide
+    os.chdir(tempfile.mkdtemp(dir=work_root))
+    _shard["parsed"] = parse_sleec(spec, read_file=False)
+    _shard["discovered"] = discovered
+
+
+def _run_analysis_shard(analysis, i, options):
+    model, rules, concerns, purposes, relations, Action_Mapping, Actions = _shard["parsed"]
+    discovered = _shard["discovered"]
+    entry = {"index": i, "skipped": False, "conflicting": [], "profiling": [], "phases": [], "log": "",
+             "result": None, "unknown": False}
+    if analysis == "conflict":
+        known = replay_conflicting_set(discovered, i)
+        if known is not None and skip_conflicting(known, i):
+            entry["skipped"] = True
+            discovered[i] = []
+            return entry
+
+    profiling_file = PROFILING_FILES.get(analysis)
+    if profiling_file:
+        phases_file = os.path.splitext(profiling_file)[0] + "_phases.json"
+        for f in (profiling_file, phases_file):
+            if os.path.exists(f):
+                os.remove(f)
+
+    issued = BudgetExceeded.issued
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        if analysis == "redundancy":
+            res = check_red(model, rules, relations, Action_Mapping, Actions, indices={i}, **options)
+        elif analysis == "conflict":
+            found = set()
+            res = check_conflict(model, rules, relations, Action_Mapping, Actions, indices={i},
+                                 conflicting_set=found, **options)
+            entry["conflicting"] = sorted(found)
+            discovered[i] = entry["conflicting"]
+        elif analysis == "concern":
+            res = check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, indices={i}, **options)
+        elif analysis == "max":
+            records = []
+            res = get_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, records=records, **options)
+            entry["records"] = records
+        else:
+            res = check_purposes(model, purposes, rules, relations, Action_Mapping, Actions, indices={i}, **options)
+
+    entry["result"] = res
+    entry["unknown"] = BudgetExceeded.issued > issued
+    entry["log"] = log.getvalue()
+    if profiling_file and os.path.exists(profiling_file):
+        with open(profiling_file) as f:
+            entry["profiling"] = f.readlines()[1:]
+        with open(phases_file) as f:
+            entry["phases"] = json.load(f)["events"]
+    return entry
+
+
+def merge_analysis_reports(analysis, entries, model, model_str="", to_print=True, multi_entry=False,
+                           profiling=False):
+    """
+    merge per-rule shard results in rule order into what the serial analysis returns and writes
+    """
+    output = ""
+    adj_hl = []
+    flagged = False
+    multi_output = []
+    rows = []
+    profiler = PhaseProfiler()
+    conflicting_set = set()
+    multi_entry = multi_entry and analysis != "concern"
+
+    for entry in sorted(entries, key=lambda e: e["index"]):
+        i = entry["index"]
+        if analysis == "conflict" and skip_conflicting(conflicting_set, i):
+            # this is what check_conflict reports for a rule it skips
+            chunk = ""
+            if to_print:
+                print("check rule_{}".format(i + 1))
+            else:
+                chunk += "check rule_{}\n".format(i + 1)
+            chunk += "Conflicting SLEEC rule:\n"
+            target = model.ruleBlock.rules[i]
+            start, end = target._tx_position, target._tx_position_end
+            chunk += "{}\n".format(model_str[start: end])
+            chunk += "Since it was mentioned in other conflict reported above:\n"
+            chunk += "*" * 100 + '\n'
+            if not multi_entry:
+                output += chunk
+            continue
+        assert not entry["skipped"]
+        if analysis == "conflict":
+            conflicting_set.update(entry["conflicting"])
+
+        sys.stdout.write(entry["log"])
+        rows += entry["profiling"]
+        profiler.events += entry["phases"]
+        if multi_entry:
+            multi_output += entry["result"]
+        else:
+            res, chunk, chunk_hl = entry["result"]
+            flagged = flagged or res
+            # (-1, -1) marks a highlight find_relative_pos could not place, it is not an offset
+            adj_hl += [(s, e) if (s, e) == (-1, -1) else (s + len(output), e + len(output)) for s, e in chunk_hl]
+            output += chunk
+
+    if profiling and analysis in PROFILING_FILES:
+        with open(PROFILING_FILES[analysis], 'w') as profiling_file:
+            profiling_file.write(PROFILING_HEADER)
+            profiling_file.writelines(rows)
+        profiler.export(os.path.splitext(PROFILING_FILES[analysis])[0])
+
+    if multi_entry:
+        return multi_output
+    else:
+        return flagged, output, adj_hl
+
+
+def run_parallel_analysis(analysis, spec, jobs, **options):
+    """
+    shard the per-rule (per-concern, per-purpose) loop of an analysis over jobs worker processes.
+    options are the keyword arguments of the serial check function; the merged result is the same
+    as the serial call returns
+    """
+    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(spec, read_file=False)
+    count = {"concern": len(concerns), "purpose": len(purposes)}.get(analysis, len(rules))
+    if options.get("log_z3"):
+        options["log_z3"] = os.path.abspath(options["log_z3"])
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as work_root, ctx.Manager() as manager:
+        discovered = manager.dict()
+        with ctx.Pool(processes=jobs, initializer=_init_analysis_worker,
+                      initargs=(spec, work_root, discovered)) as pool:
+            entries = pool.map(functools.partial(_run_analysis_shard, analysis, options=options), range(count),
+                               chunksize=1)
+
+    return merge_analysis_reports(analysis, entries, model, model_str=options.get("model_str", ""),
+                                  to_print=options.get("to_print", True),
+                                  multi_entry=options.get("multi_entry", False),
+                                  profiling=options.get("profiling", PROFILING_DEFAULTS[analysis]))
+
+# the configurations raced by run_portfolio_analysis: a name and the check_property_refining knobs it overrides
+# (see analyzer.set_refining_strategy); the first one keeps the arguments of the analysis as they are
+PORTFOLIO = [{"name": "default"},
+             {"name": "restart", "restart": True},
+             {"name": "universal-blocking", "universal_blocking": True},
+             {"name": "seed-7", "random_seed": 7}]
+
+
+def _run_portfolio_worker(analysis, spec, work_root, config, options, encodings, decided, discovered, results):
+    # works through the checks in order, skipping the ones another configuration already answered and
+    # abandoning the current one as soon as that happens
+    os.chdir(tempfile.mkdtemp(dir=work_root))
+    maxsat, maxsat_timeout, schedule, deepening, backend, slicing = encodings
+    set_maxsat_engine(maxsat, maxsat_timeout)
+    set_vol_bound_schedule(schedule, deepening)
+    set_solver_backend(backend)
+    set_slicing(slicing)
+    strategy = dict([(knob, value) for knob, value in config.items() if knob != "name"])
+    context = None
+    for i in range(len(decided)):
+        if decided[i]:
+            continue
+        if context is None:
+            context = AnalysisContext()
+            with context:
+                _shard["parsed"] = parse_sleec(spec, read_file=False)
+        # only what the winning configurations found about earlier rules counts
+        _shard["discovered"] = dict(discovered)
+        set_refining_strategy(strategy, cancelled=lambda i=i: decided[i] != 0)
+        start = time.time()
+        try:
+            with context:
+                entry = _run_analysis_shard(analysis, i, options)
+        except RefiningCancelled:
+            # the check was left half way, its encoder state goes with the context
+            context = None
+            continue
+        results.put((config["name"], i, entry, time.time() - start))
+    results.put((config["name"], None, None, 0))
+
+
+def run_portfolio_analysis(analysis, spec, portfolio=None, log_file=None, stats_file=None, **options):
+    """
+    race the configurations of portfolio (PORTFOLIO by default), one worker process each, on every check
+    of a redundancy/conflict analysis (on the query of a max analysis): the first configuration done with a
+    check answers it and the others drop it for the next one. The winner of every check is printed, and
+    appended as a json line to log_file if given; the checks won by every engine are added to the
+    statistics in stats_file if given. options and the result are those of the serial analysis
+    """
+    portfolio = PORTFOLIO if portfolio is None else portfolio
+    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(spec, read_file=False)
+    count = 1 if analysis == "max" else len(rules)
+    records = options.pop("records", None)
+    if options.get("log_z3"):
+        options["log_z3"] = os.path.abspath(options["log_z3"])
+
+    # spawned workers start from the defaults, so they are handed the encodings selected here
+    encodings = (logic_operator.maxsat_engine, logic_operator.maxsat_timeout, VOL_BOUND_SCHEDULE, DEEPENING,
+                 analyzer.solver_backend, SLICING)
+    ctx = multiprocessing.get_context("spawn")
+    entries = [None] * count
+    reports = [0] * count
+    fallback = dict()
+    wins = []
+    with tempfile.TemporaryDirectory() as work_root, ctx.Manager() as manager:
+        discovered = manager.dict()
+        decided = ctx.Array("b", count)
+        results = ctx.Queue()
+        workers = [ctx.Process(target=_run_portfolio_worker, daemon=True,
+                               args=(analysis, spec, work_root, config, options, encodings, decided, discovered,
+                                     results))
+                   for config in portfolio]
+        for worker in workers:
+            worker.start()
+        running = len(workers)
+        try:
+            while running and None in entries:
+                try:
+                    name, i, entry, seconds = results.get(timeout=1)
+                except queue.Empty:
+                    running = sum(worker.is_alive() for worker in workers)
+                    continue
+                if i is None:
+                    running -= 1
+                    continue
+                reports[i] += 1
+                if entry["unknown"] and reports[i] < len(workers):
+                    # ran out of budget: the answer of the check unless another configuration does better
+                    fallback.setdefault(i, (name, entry, seconds))
+                    continue
+                if entries[i] is None:
+                    if entry["unknown"]:
+                        name, entry, seconds = fallback.get(i, (name, entry, seconds))
+                    entries[i] = entry
+                    decided[i] = 1
+                    if analysis == "conflict":
+                        discovered[i] = entry["conflicting"]
+                    check = "max" if analysis == "max" else "rule_{}".format(i + 1)
+                    if entry["unknown"]:
+                        print("portfolio: {} ran out of budget in every configuration".format(check))
+                    else:
+                        print("portfolio: {} won by {} in {:.2f}s".format(check, name, seconds))
+                    wins.append({"analysis": analysis, "check": check, "config": name, "seconds": seconds,
+                                 "unknown": entry["unknown"]})
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+    if None in entries:
+        raise RuntimeError("portfolio: no configuration finished check {}".format(entries.index(None) + 1))
+
+    if log_file:
+        with open(log_file, 'a') as f:
+            for win in wins:
+                f.write(json.dumps(win) + "\n")
+    if stats_file:
+        record_engine_stats(stats_file, analysis, spec, portfolio, wins)
+
+    if analysis == "max":
+        sys.stdout.write(entries[0]["log"])
+        if records is not None:
+            records.extend(entries[0]["records"])
+        return entries[0]["result"]
+    return merge_analysis_reports(analysis, entries, model, model_str=options.get("model_str", ""),
+                                  to_print=options.get("to_print", True),
+                                  multi_entry=options.get("multi_entry", False),
+                                  profiling=options.get("profiling", PROFILING_DEFAULTS[analysis]))
+
+
+def check_input_red(model_str, multi_entry=False, jobs=1, query_budget=None, analysis_budget=None):
+    if jobs > 1:
+        res = run_parallel_analysis("redundancy", model_str, jobs, check_proof=True, model_str=model_str,
+                                    multi_entry=multi_entry, query_budget=query_budget,
+                                    analysis_budget=analysis_budget)
+    else:
+        model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(model_str, read_file=False)
+        res = check_red(model, rules, relations, Action_Mapping, Actions, check_proof=True, model_str=model_str,
+                        multi_entry=multi_entry, query_budget=query_budget, analysis_budget=analysis_budget)
     # reset
     scalar_mask.clear()
     scalar_type.clear()
@@ -1646,10 +2278,15 @@ def check_input_red(model_str, multi_entry=False):
     return res
 
 
-def check_input_conflict(model_str, multi_entry=False):
-    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(model_str, read_file=False)
-    res = check_conflict(model, rules, relations, Action_Mapping, Actions, check_proof=True, model_str=model_str,
-                         multi_entry=multi_entry)
+def check_input_conflict(model_str, multi_entry=False, jobs=1, query_budget=None, analysis_budget=None):
+    if jobs > 1:
+        res = run_parallel_analysis("conflict", model_str, jobs, check_proof=True, model_str=model_str,
+                                    multi_entry=multi_entry, query_budget=query_budget,
+                                    analysis_budget=analysis_budget)
+    else:
+        model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(model_str, read_file=False)
+        res = check_conflict(model, rules, relations, Action_Mapping, Actions, check_proof=True, model_str=model_str,
+                             multi_entry=multi_entry, query_budget=query_budget, analysis_budget=analysis_budget)
     # reset
     scalar_mask.clear()
     scalar_type.clear()
@@ -1658,11 +2295,15 @@ def check_input_conflict(model_str, multi_entry=False):
     return res
 
 
-def check_input_purpose(model_str, multi_entry=False):
-    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(model_str, read_file=False)
-    res = check_purposes(model, purposes, rules, relations, Action_Mapping, Actions, check_proof=True,
-                         model_str=model_str,
-                         multi_entry=multi_entry)
+def check_input_purpose(model_str, multi_entry=False, jobs=1):
+    if jobs > 1:
+        res = run_parallel_analysis("purpose", model_str, jobs, check_proof=True, model_str=model_str,
+                                    multi_entry=multi_entry)
+    else:
+        model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(model_str, read_file=False)
+        res = check_purposes(model, purposes, rules, relations, Action_Mapping, Actions, check_proof=True,
+                             model_str=model_str,
+                             multi_entry=multi_entry)
     # reset
     scalar_mask.clear()
     scalar_type.clear()
@@ -1671,9 +2312,12 @@ def check_input_purpose(model_str, multi_entry=False):
     return res
 
 
-def check_input_concerns(model_str):
-    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(model_str, read_file=False)
-    res = check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, model_str=model_str)
+def check_input_concerns(model_str, jobs=1):
+    if jobs > 1:
+        res = run_parallel_analysis("concern", model_str, jobs, model_str=model_str)
+    else:
+        model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(model_str, read_file=False)
+        res = check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, model_str=model_str)
     # reset
     scalar_mask.clear()
     scalar_type.clear()
@@ -1686,44 +2330,88 @@ def check_input_concerns(model_str):
 from argparse import ArgumentParser
 
 
-def parse_and_check_conflict(filename, z3=False):
-    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(filename,
-                                                                                       read_file=True)
+def _entered(context):
+    # runs the analysis in the given AnalysisContext, or on the process global state when there is none
+    return context if context is not None else contextlib.nullcontext()
+
+
+def parse_and_check_conflict(filename, z3=False, jobs=1, context=None, portfolio=None,
+                            portfolio_log=None, query_budget=None, analysis_budget=None):
     if z3:
         log_z3 = os.path.splitext(os.path.basename(filename))[0]
     else:
         log_z3 = ""
-
-    res = check_conflict(model, rules, relations, Action_Mapping, Actions, check_proof=False, profiling=True, log_z3=log_z3)
+    stats_file = None
+    if ENGINE != "refining":
+        portfolio, stats_file = engine_portfolio("conflict", read_model_file(filename), portfolio)
+    if portfolio is not None:
+        return run_portfolio_analysis("conflict", read_model_file(filename), portfolio, log_file=portfolio_log,
+                                      stats_file=stats_file, check_proof=False, profiling=True, log_z3=log_z3,
+                                      query_budget=query_budget, analysis_budget=analysis_budget)
+    if jobs > 1:
+        return run_parallel_analysis("conflict", read_model_file(filename), jobs, check_proof=False, profiling=True,
+                                     log_z3=log_z3, query_budget=query_budget, analysis_budget=analysis_budget)
+
+    with _entered(context):
+        model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(filename,
+                                                                                           read_file=True)
+        res = check_conflict(model, rules, relations, Action_Mapping, Actions, check_proof=False, profiling=True,
+                             log_z3=log_z3, query_budget=query_budget, analysis_budget=analysis_budget)
     return res
 
 
-def parse_and_check_red(filename, z3=False):
-    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(filename,
-                                                                                       read_file=True)
+def parse_and_check_red(filename, z3=False, jobs=1, context=None, portfolio=None,
+                       portfolio_log=None, query_budget=None, analysis_budget=None):
     if z3:
         log_z3 = os.path.splitext(os.path.basename(filename))[0]
     else:
         log_z3 = ""
-    res = check_red(model, rules, relations, Action_Mapping, Actions, check_proof=False,profiling=True, log_z3=log_z3)
+    stats_file = None
+    if ENGINE != "refining":
+        portfolio, stats_file = engine_portfolio("redundancy", read_model_file(filename), portfolio)
+    if portfolio is not None:
+        return run_portfolio_analysis("redundancy", read_model_file(filename), portfolio, log_file=portfolio_log,
+                                      stats_file=stats_file, check_proof=False, profiling=True, log_z3=log_z3,
+                                      query_budget=query_budget, analysis_budget=analysis_budget)
+    if jobs > 1:
+        return run_parallel_analysis("redundancy", read_model_file(filename), jobs, check_proof=False, profiling=True,
+                                     log_z3=log_z3, query_budget=query_budget, analysis_budget=analysis_budget)
+
+    with _entered(context):
+        model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(filename,
+                                                                                           read_file=True)
+        res = check_red(model, rules, relations, Action_Mapping, Actions, check_proof=False, profiling=True,
+                        log_z3=log_z3, query_budget=query_budget, analysis_budget=analysis_budget)
     return res
 
 
-def parse_and_check_concern(filename, z3=False):
-    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(filename,
-                                                                                       read_file=True)
+def parse_and_check_concern(filename, z3=False, jobs=1, profiling=False, context=None):
     if z3:
         log_z3 = os.path.splitext(os.path.basename(filename))[0]
     else:
         log_z3 = ""
-    res = check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, log_z3=log_z3)
+    if jobs > 1:
+        return run_parallel_analysis("concern", read_model_file(filename), jobs, log_z3=log_z3)
+
+    with _entered(context):
+        model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(filename,
+                                                                                           read_file=True)
+        res = check_concerns(model, rules, concerns, relations, Action_Mapping, Actions, log_z3=log_z3,
+                             profiling=profiling)
     return res
 
-def parse_and_max_trace(filename, target_rule_ids, z3=False, tracetime= 20):
-    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(filename,
-                                                                                       read_file=True)
-    model_str = read_model_file(filename)
-    res = get_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, target_rule_ids, model_str= model_str, bound_time=tracetime)
+def parse_and_max_trace(filename, target_rule_ids, z3=False, tracetime= 20, records=None, profiling=False,
+                        context=None, portfolio=None, portfolio_log=None, query_budget=None,
+                        analysis_budget=None):
+    if portfolio is not None:
+        model_str = read_model_file(filename)
+        res = run_portfolio_analysis("max", model_str, portfolio, log_file=portfolio_log,
+                                     target_rule_ids=target_rule_ids, model_str=model_str, bound_time=tracetime,
+                                     records=records, profiling=profiling, query_budget=query_budget,
+                                     analysis_budget=analysis_budget)
+    else:
+        res = _max_trace(filename, target_rule_ids, tracetime, records, profiling, context, query_budget,
+                         analysis_budget)
     if isinstance(res, str):
         print("final max rule triggering tarce:")
         print(res)
@@ -1732,6 +2420,29 @@ def parse_and_max_trace(filename, target_rule_ids, z3=False, tracetime= 20):
 
     return res
 
+
+def _max_trace(filename, target_rule_ids, tracetime, records, profiling, context, query_budget, analysis_budget):
+    with _entered(context):
+        model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(filename,
+                                                                                           read_file=True)
+        model_str = read_model_file(filename)
+        res = get_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, target_rule_ids,
+                                    model_str=model_str, bound_time=tracetime, records=records, profiling=profiling,
+                                    query_budget=query_budget, analysis_budget=analysis_budget)
+    return res
+
+def parse_and_sweep_max_trace(filename, target_rule_ids, windows):
+    model, rules, concerns, purposes, relations, Action_Mapping, Actions = parse_sleec(filename,
+                                                                                       read_file=True)
+    model_str = read_model_file(filename)
+    results = sweep_max_trigger_trace(model, rules, relations, Action_Mapping, Actions, target_rule_ids, windows,
+                                      model_str=model_str)
+    for entry in results:
+        print("time window {} ({}, {:.2f}s):".format(entry["time_window"], entry["status"], entry["seconds"]))
+        if entry["trace"] is not None:
+            print(entry["trace"])
+    return results
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument('--filename', help="SLEEC file to analyze", type=str)
@@ -1739,7 +2450,57 @@ if __name__ == "__main__":
     parser.add_argument("--z3", help= "print raw z3 SMTLIB encoding", action='store_true' )
     parser.add_argument("--tracetime", help = "the max time appeared in a solution trace")
     parser.add_argument('--IDs', nargs='*', help='a list of rule IDs to be triggered for max analysis', required=False)
+    parser.add_argument("--jobs", help="number of worker processes for redundancy/conflict/concern analysis",
+                        type=int, default=1)
+    parser.add_argument("--sweep", nargs='*', type=int, required=False,
+                        help="max analysis for each of these trace times on one solver (instead of --tracetime)")
+    parser.add_argument("--maxsat", choices=list(MAXSAT_ENGINES), default="core",
+                        help="MaxSAT engine used to minimize solution traces (default: core)")
+    parser.add_argument("--maxsat-timeout", type=float, default=None,
+                        help="seconds per MaxSAT call before it settles for a non-minimal trace")
+    parser.add_argument("--portfolio", nargs='*', required=False, choices=[c["name"] for c in PORTFOLIO],
+                        help="race these configurations (all of them if none is named) in worker processes for "
+                             "redundancy/conflict/max analysis, taking each check from the first one done")
+    parser.add_argument("--portfolio-log", help="json lines file the winning configurations are appended to")
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help="wall clock seconds per rule check (per query of max analysis)")
+    parser.add_argument("--solver-time-limit", type=float, default=None,
+                        help="seconds of solving per rule check")
+    parser.add_argument("--memory-limit", type=float, default=None, help="resident memory in MB per rule check")
+    parser.add_argument("--round-limit", type=int, default=None, help="CEGAR rounds per rule check")
+    parser.add_argument("--analysis-time-limit", type=float, default=None,
+                        help="wall clock seconds for the whole analysis (per worker with --jobs/--portfolio); "
+                             "the checks left when it runs out report unknown")
+    parser.add_argument("--vol-schedule", nargs='+', type=int, default=None,
+                        help="multiples of the vol bound a check escalates to after a bounded UNSAT (default: 5)")
+    parser.add_argument("--no-deepening", action='store_true',
+                        help="check every escalated vol bound from scratch instead of raising it in the live check")
+    parser.add_argument("--no-slicing", action='store_true',
+                        help="give every redundancy/conflict check all the rules and relations, not only the ones in "
+                             "the cone of influence of the rule checked")
+    parser.add_argument("--engine", choices=ENGINES, default="refining",
+                        help="redundancy/conflict checks on the CEGAR loop, on z3 with the quantified encoding, "
+                             "or auto: race the two, or run the one --engine-stats shows winning on the spec")
+    parser.add_argument("--engine-stats", help="json file of the per spec engine statistics for --engine auto")
+    parser.add_argument("--backend", choices=SOLVER_BACKENDS, default="pysmt",
+                        help="how formulas reach z3: through pysmt's solver, or natively with memoized terms, "
+                             "z3 assumption literals and models read from z3 (default: pysmt)")
     args = parser.parse_args()
+    query_budget = None
+    if any(limit is not None for limit in [args.time_limit, args.solver_time_limit, args.memory_limit,
+                                           args.round_limit]):
+        query_budget = Budget(wall_time=args.time_limit, solver_time=args.solver_time_limit,
+                              memory=args.memory_limit, rounds=args.round_limit)
+    analysis_budget = Budget(wall_time=args.analysis_time_limit) if args.analysis_time_limit is not None else None
+    if args.portfolio is not None:
+        portfolio = [c for c in PORTFOLIO if not args.portfolio or c["name"] in args.portfolio]
+    else:
+        portfolio = None
+    set_maxsat_engine(args.maxsat, args.maxsat_timeout)
+    set_vol_bound_schedule(args.vol_schedule, not args.no_deepening)
+    set_solver_backend(args.backend)
+    set_engine(args.engine, args.engine_stats)
+    set_slicing(not args.no_slicing)
     supported_mode = {"redundancy": parse_and_check_red, "conflict": parse_and_check_conflict,
                       "concern": parse_and_check_concern, "max": parse_and_max_trace}
     analysis = args.analysis
@@ -1748,11 +2509,21 @@ if __name__ == "__main__":
         print("running redundancy for default")
     if analysis != "max":
         analysis_func = supported_mode.get(analysis, parse_and_check_red)
-        analysis_func(args.filename, args.z3)
+        if analysis_func in (parse_and_check_red, parse_and_check_conflict):
+            analysis_func(args.filename, args.z3, args.jobs, portfolio=portfolio,
+                          portfolio_log=args.portfolio_log, query_budget=query_budget,
+                          analysis_budget=analysis_budget)
+        else:
+            analysis_func(args.filename, args.z3, jobs=args.jobs)
     else:
         if not args.IDs:
             args.IDs = []
-        parse_and_max_trace(args.filename, set(args.IDs), False, int(args.tracetime), )
+        if args.sweep:
+            parse_and_sweep_max_trace(args.filename, set(args.IDs), args.sweep)
+        else:
+            parse_and_max_trace(args.filename, set(args.IDs), False, int(args.tracetime), portfolio=portfolio,
+                                portfolio_log=args.portfolio_log, query_budget=query_budget,
+                                analysis_budget=analysis_budget)
 
 #
 #
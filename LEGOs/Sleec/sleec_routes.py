@@ -6,6 +6,7 @@ import json
 import subprocess
 import shutil
 from sleecParser import check_input_red, check_input_conflict
+from analyzer import Budget
 # import signal
 #
 # def handler(signum, frame):
@@ -52,9 +53,11 @@ def get_query_from_react():
         # signal.alarm(TIMEOUT)
         model_str = SLEEC_template.format(concerns = concerns, rules = rules, definitions=definitions)
         if editor_input['type'] == "Conflict":
-            result = check_input_conflict(model_str, multi_entry=True)
+            result = check_input_conflict(model_str, multi_entry=True,
+                                          analysis_budget=Budget(wall_time=TIMEOUT))
         elif editor_input['type'] == "Redundancies":
-            result = check_input_red(model_str, multi_entry=True)
+            result = check_input_red(model_str, multi_entry=True,
+                                     analysis_budget=Budget(wall_time=TIMEOUT))
         else:
             result = "Error: Not a valid command"
 
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Check that cone-of-influence slicing leaves the proof-mode explanations of LEGOs unchanged.
+
+Every spec is run through the redundancy and conflict analyses with proofs on (as the web
+front end runs them), once with slicing and once without, each in a fresh spawned interpreter.
+The reports (the rules flagged and the rules blamed for them) and the highlighted text have to
+be the same; the order the blamed rules of a report come in is not, as it already differs from one
+run to the next.
+
+Usage:
+  python benchmarks/check_slicing.py [--specs LEGOs/Tutorial1/demo1/demo1.sleec ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import warnings
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# demo1 has a known conflict (R21_1/R21_4) and a known redundancy (R5, because of R6 and R7)
+DEFAULT_SPECS = ["LEGOs/Tutorial1/demo1/demo1.sleec", "domains/ASPEN.sleec"]
+ANALYSES = ("redundancy", "conflict")
+REPORT_SEPARATOR = "*" * 100
+RULE_SEPARATOR = "-" * 100
+
+
+def _add_legos_paths() -> None:
+    for path in (REPO_ROOT / "LEGOs" / "Analyzer", REPO_ROOT / "LEGOs" / "Sleec"):
+        if str(path) not in sys.path:
+            sys.path.append(str(path))
+
+
+def normalize(output: str, highlights: List) -> Dict:
+    """The reports of an analysis with the blamed rules of each sorted, and the highlighted text."""
+    reports = []
+    for block in output.split(REPORT_SEPARATOR):
+        parts = [part.strip() for part in block.split(RULE_SEPARATOR) if part.strip()]
+        if not parts:
+            continue
+        cut = next((k + 1 for k, part in enumerate(parts) if part.startswith("Because of")), len(parts))
+        reports.append(parts[:cut] + sorted(parts[cut:]))
+    highlighted = sorted(output[start:end] if (start, end) != (-1, -1) else "" for start, end in highlights)
+    return {"reports": reports, "highlighted": highlighted}
+
+
+def _explain(spec: str, analysis: str, slicing: bool) -> Dict:
+    """Worker entry point: the proof-mode report of one analysis in a private working directory."""
+    _add_legos_paths()
+    import sleecParser  # type: ignore
+
+    warnings.simplefilter("ignore")
+    sleecParser.set_slicing(slicing)
+    model_str = (REPO_ROOT / spec).read_text(encoding="utf-8")
+    check = sleecParser.check_input_red if analysis == "redundancy" else sleecParser.check_input_conflict
+    os.chdir(tempfile.mkdtemp(prefix="legos_slicing_"))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        flagged, output, highlights = check(model_str)
+    return dict(normalize(output, highlights), flagged=flagged)
+
+
+def compare(specs: List[str]) -> List[str]:
+    ctx = multiprocessing.get_context("spawn")
+    mismatches = []
+    with ctx.Pool(processes=1, maxtasksperchild=1) as pool:
+        for spec in specs:
+            for analysis in ANALYSES:
+                sliced = pool.apply(_explain, (spec, analysis, True))
+                full = pool.apply(_explain, (spec, analysis, False))
+                same = sliced == full
+                print(f"[slicing] {spec} {analysis}: {'same' if same else 'DIFFERENT'}")
+                if not same:
+                    mismatches.append(f"{spec} {analysis}")
+                    for key in ("flagged", "reports", "highlighted"):
+                        if sliced[key] != full[key]:
+                            print(f"  {key} with slicing:\n{sliced[key]}\n  {key} without:\n{full[key]}")
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--specs", nargs="+", default=DEFAULT_SPECS, help="Specs relative to the repo root.")
+    args = parser.parse_args()
+    mismatches = compare(args.specs)
+    if mismatches:
+        raise SystemExit(f"Slicing changed the explanations of: {', '.join(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Repeatable benchmarks for the LEGOs analyses over the bundled SLEEC specs.
+
+Every case (spec x analysis, and spec x time window for max-trace) runs in a fresh spawned
+interpreter, so LEGOs' module-level state and the peak RSS of one case never leak into the
+next. Per case we record wall time, peak RSS, solver calls, CEGAR rounds and the final domain
+size (from LEGOs' phase profiler), and append the run to a JSON history file.
+
+Usage:
+  python benchmarks/run_benchmarks.py run [--cases 'DAISY/*'] [--label my-change] [--maxsat stratified]
+      [--backend native]
+  python benchmarks/run_benchmarks.py compare [--baseline main] [--candidate my-change]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fnmatch
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_SUITE = BENCH_DIR / "suite.json"
+DEFAULT_HISTORY = BENCH_DIR / "history.json"
+DEFAULT_TIMEOUT = 900
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_MIN_WALL_DELTA = 0.5
+
+ANALYSES = ("redundancy", "conflict", "concern", "max")
+METRICS = ("wall_time", "peak_rss_kb", "solver_calls", "cegar_rounds", "domain_size")
+# phase profile each analysis exports into its working directory
+PHASES_FILES = {
+    "redundancy": "profiling_red_phases.json",
+    "conflict": "profiling_conflict_phases.json",
+    "concern": "profiling_concern_phases.json",
+    "max": "profiling_max_phases.json",
+}
+
+sys.path.insert(0, str(REPO_ROOT))
+from legos_integration import write_atomic  # noqa: E402
+
+
+def _add_legos_paths() -> None:
+    for path in (REPO_ROOT / "LEGOs" / "Analyzer", REPO_ROOT / "LEGOs" / "Sleec"):
+        if str(path) not in sys.path:
+            sys.path.append(str(path))
+
+
+def load_suite(suite_path: Path) -> List[Dict]:
+    """
+    Expand a suite file into benchmark cases.
+
+    The suite is a JSON array of `{"spec", "analyses", "max_rules", "time_windows"}` entries;
+    `max` is run once per time window, targeting `max_rules`. Cases are named
+    `<spec stem>/<analysis>` and `<spec stem>/max@<time window>`.
+    """
+    try:
+        data = json.loads(suite_path.read_text(encoding="utf-8"))
+    except Exception as exc:  # noqa: BLE001
+        raise SystemExit(f"Failed to read benchmark suite {suite_path}: {exc}") from exc
+
+    cases = []
+    for entry in data:
+        spec = entry["spec"]
+        stem = Path(spec).stem
+        for analysis in entry.get("analyses", []):
+            if analysis not in ANALYSES:
+                raise SystemExit(f"Unknown analysis '{analysis}' for {spec}; expected one of {ANALYSES}.")
+            if analysis != "max":
+                cases.append({"name": f"{stem}/{analysis}", "spec": spec, "analysis": analysis})
+                continue
+            for time_window in entry.get("time_windows", [15]):
+                cases.append(
+                    {
+                        "name": f"{stem}/max@{time_window}",
+                        "spec": spec,
+                        "analysis": "max",
+                        "rules": entry.get("max_rules", []),
+                        "time_window": int(time_window),
+                    }
+                )
+    return cases
+
+
+def _run_case(case: Dict) -> Dict:
+    """
+    Worker entry point: run one case in a private working directory (LEGOs writes its proof and
+    profiling files to the current directory) and collect its metrics.
+    """
+    _add_legos_paths()
+    import sleecParser  # type: ignore
+    from phase_profiler import summarize  # type: ignore
+
+    # after the imports: pysmt installs its own warning filter when it is loaded
+    warnings.simplefilter("ignore")
+    sleecParser.set_maxsat_engine(case.get("maxsat", "core"))
+    sleecParser.set_solver_backend(case.get("backend", "pysmt"))
+
+    spec = str(REPO_ROOT / case["spec"])
+    work_dir = tempfile.mkdtemp(prefix="legos_bench_")
+    os.chdir(work_dir)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            if case["analysis"] == "redundancy":
+                sleecParser.parse_and_check_red(spec)
+            elif case["analysis"] == "conflict":
+                sleecParser.parse_and_check_conflict(spec)
+            elif case["analysis"] == "concern":
+                sleecParser.parse_and_check_concern(spec, profiling=True)
+            else:
+                sleecParser.parse_and_max_trace(spec, set(case["rules"]), tracetime=case["time_window"],
+                                                profiling=True)
+            wall_time = time.perf_counter() - start
+        phases = Path(PHASES_FILES[case["analysis"]])
+        events = json.loads(phases.read_text())["events"] if phases.exists() else []
+        result = {"status": "ok", "wall_time": round(wall_time, 3)}
+        result.update(summarize(events))
+    except Exception as exc:  # noqa: BLE001
+        result = {"status": "error", "error": f"{type(exc).__name__}: {exc}"}
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    # ru_maxrss is in KiB on Linux
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def run_case(case: Dict, timeout: Optional[float] = DEFAULT_TIMEOUT) -> Dict:
+    """Run `case` in a fresh spawned interpreter, giving up after `timeout` seconds."""
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes=1, maxtasksperchild=1) as pool:
+        pending = pool.apply_async(_run_case, (case,))
+        try:
+            return pending.get(timeout)
+        except multiprocessing.TimeoutError:
+            return {"status": "timeout", "error": f"exceeded {timeout}s"}
+
+
+def _median_result(results: List[Dict]) -> Dict:
+    ok = [r for r in results if r["status"] == "ok"]
+    if len(ok) != len(results):
+        return next(r for r in results if r["status"] != "ok")
+    merged = {"status": "ok", "repeats": len(ok)}
+    for metric in METRICS:
+        merged[metric] = statistics.median(r[metric] for r in ok)
+    return merged
+
+
+def _git_commit() -> Optional[str]:
+    with contextlib.suppress(Exception):
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    return None
+
+
+def run_suite(cases: List[Dict], repeat: int = 1, timeout: Optional[float] = DEFAULT_TIMEOUT) -> List[Dict]:
+    results = []
+    for case in cases:
+        result = dict(case)
+        result.update(_median_result([run_case(case, timeout) for _ in range(repeat)]))
+        if result["status"] == "ok":
+            print(
+                f"[bench] {case['name']:<28} {result['wall_time']:>8.2f}s  {result['peak_rss_kb'] / 1024:>7.1f} MiB  "
+                f"solves={result['solver_calls']} rounds={result['cegar_rounds']} domain={result['domain_size']}"
+            )
+        else:
+            print(f"[bench] {case['name']:<28} {result['status']}: {result.get('error', '')}")
+        results.append(result)
+    return results
+
+
+def load_history(history_path: Path) -> List[Dict]:
+    if not history_path.exists():
+        return []
+    return json.loads(history_path.read_text(encoding="utf-8"))["runs"]
+
+
+def append_history(history_path: Path, run: Dict) -> None:
+    runs = load_history(history_path)
+    runs.append(run)
+    write_atomic(history_path, json.dumps({"runs": runs}, indent=2))
+
+
+def select_run(runs: List[Dict], selector: str) -> Dict:
+    """Pick a run by label (latest run with that label wins) or by index into the history (e.g. -1)."""
+    for run in reversed(runs):
+        if run.get("label") == selector:
+            return run
+    try:
+        return runs[int(selector)]
+    except (ValueError, IndexError):
+        raise SystemExit(f"No benchmark run matches '{selector}' ({len(runs)} runs in history).") from None
+
+
+def compare_runs(
+    baseline: Dict,
+    candidate: Dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    min_wall_delta: float = DEFAULT_MIN_WALL_DELTA,
+) -> List[Dict]:
+    """
+    Return the regressions of `candidate` against `baseline`: a case that stopped succeeding, or a
+    metric that grew by more than `threshold` (relative). Wall-time changes below `min_wall_delta`
+    seconds are treated as noise.
+    """
+    regressions = []
+    base_cases = {case["name"]: case for case in baseline["cases"]}
+    for case in candidate["cases"]:
+        base = base_cases.get(case["name"])
+        if base is None or base["status"] != "ok":
+            continue
+        if case["status"] != "ok":
+            regressions.append({"name": case["name"], "metric": "status", "baseline": "ok", "candidate": case["status"]})
+            continue
+        for metric in METRICS:
+            before, after = base.get(metric), case.get(metric)
+            if before is None or after is None or after <= before * (1 + threshold):
+                continue
+            if metric == "wall_time" and after - before < min_wall_delta:
+                continue
+            regressions.append({"name": case["name"], "metric": metric, "baseline": before, "candidate": after})
+    return regressions
+
+
+def _print_comparison(baseline: Dict, candidate: Dict, regressions: List[Dict]) -> None:
+    print(f"[bench] baseline  {baseline.get('label')} ({baseline.get('timestamp')})")
+    print(f"[bench] candidate {candidate.get('label')} ({candidate.get('timestamp')})")
+    base_cases = {case["name"]: case for case in baseline["cases"]}
+    for case in candidate["cases"]:
+        base = base_cases.get(case["name"])
+        if base is None or base["status"] != "ok" or case["status"] != "ok":
+            status = case["status"] if base is not None else f"{case['status']} (new)"
+            print(f"  {case['name']:<28} {status}")
+            continue
+        change = (case["wall_time"] - base["wall_time"]) / base["wall_time"] if base["wall_time"] else 0.0
+        print(f"  {case['name']:<28} {base['wall_time']:>8.2f}s -> {case['wall_time']:>8.2f}s ({change:+.0%})")
+    if not regressions:
+        print("[bench] no regressions")
+        return
+    print(f"[bench] {len(regressions)} regression(s):")
+    for r in regressions:
+        print(f"  {r['name']:<28} {r['metric']}: {r['baseline']} -> {r['candidate']}")
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark LEGOs analyses and compare runs.")
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY, help=f"History file (default: {DEFAULT_HISTORY}).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run the benchmark suite and append the results to the history.")
+    run.add_argument("--suite", type=Path, default=DEFAULT_SUITE, help=f"Suite file (default: {DEFAULT_SUITE}).")
+    run.add_argument("--cases", nargs="+", help="Only run cases matching these patterns (e.g. 'DAISY/*' '*/max@15').")
+    run.add_argument("--label", help="Label of this run in the history (default: current git commit).")
+    run.add_argument("--repeat", type=int, default=1, help="Run each case N times and keep the median (default: 1).")
+    run.add_argument(
+        "--timeout", type=float, default=DEFAULT_TIMEOUT, help=f"Per-case timeout in seconds (default: {DEFAULT_TIMEOUT})."
+    )
+    run.add_argument(
+        "--maxsat",
+        choices=("core", "stratified", "optimize"),
+        default="core",
+        help="MaxSAT engine minimizing solution traces (default: core).",
+    )
+    run.add_argument(
+        "--backend",
+        choices=("pysmt", "native"),
+        default="pysmt",
+        help="How formulas reach z3: through pysmt's solver or natively (default: pysmt).",
+    )
+
+    compare = sub.add_parser("compare", help="Compare two runs from the history and flag regressions.")
+    compare.add_argument("--baseline", default="-2", help="Label or history index of the baseline run (default: -2).")
+    compare.add_argument("--candidate", default="-1", help="Label or history index of the candidate run (default: -1).")
+    compare.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Relative growth of a metric counted as a regression (default: {DEFAULT_THRESHOLD}).",
+    )
+    compare.add_argument(
+        "--min-wall-delta",
+        type=float,
+        default=DEFAULT_MIN_WALL_DELTA,
+        help=f"Ignore wall-time changes below this many seconds (default: {DEFAULT_MIN_WALL_DELTA}).",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+
+    if args.command == "compare":
+        runs = load_history(args.history)
+        baseline = select_run(runs, args.baseline)
+        candidate = select_run(runs, args.candidate)
+        regressions = compare_runs(baseline, candidate, args.threshold, args.min_wall_delta)
+        _print_comparison(baseline, candidate, regressions)
+        if regressions:
+            raise SystemExit(1)
+        return
+
+    cases = load_suite(args.suite)
+    if args.cases:
+        cases = [c for c in cases if any(fnmatch.fnmatch(c["name"], pattern) for pattern in args.cases)]
+    if not cases:
+        raise SystemExit("No benchmark cases selected.")
+    cases = [dict(c, maxsat=args.maxsat, backend=args.backend) for c in cases]
+
+    commit = _git_commit()
+    print(f"[bench] Running {len(cases)} cases (commit {commit or 'unknown'})...")
+    start = time.perf_counter()
+    results = run_suite(cases, max(1, args.repeat), args.timeout)
+    run = {
+        "label": args.label or commit or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "maxsat": args.maxsat,
+        "backend": args.backend,
+        "total_wall_time": round(time.perf_counter() - start, 3),
+        "cases": results,
+    }
+    append_history(args.history, run)
+    print(f"[bench] {len(results)} cases in {run['total_wall_time']:.2f}s; results appended to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import argparse
 import re
 from pathlib import Path
 
+from legos_integration import format_trace_jsonl, iter_trace_records
+
 
 RULE_START_PATTERN = re.compile(r"^\s*(\S+)\s+when\b")
 
@@ -59,6 +61,18 @@ def main():
 
     trace_path = Path(args.traces)
     output_path = trace_path.with_name(f"clean_{trace_path.name}")
+    if trace_path.suffix == ".jsonl":
+        # typed trace from `legos_integration.py --jsonl`: filter attributes, no string parsing
+        with output_path.open("w", encoding="utf-8") as handle:
+            for record in iter_trace_records(trace_path):
+                if record["kind"] == "Measure":
+                    record["attributes"] = {
+                        name: value for name, value in record["attributes"].items() if name in measures
+                    }
+                handle.write(format_trace_jsonl([record]))
+        print(f"clean trace written to {output_path}")
+        return
+
     lines_out = []
     for line in trace_path.read_text().splitlines():
         if "Measure(" not in line:
@@ -1,23 +1,35 @@
 import os
+import re
 import sys
+import io
+import json
+import hashlib
+import time
 import argparse
+import tempfile
+import functools
+import contextlib
+import multiprocessing
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 
-_PARSE_AND_MAX_TRACE = None
+_LEGOS_ENTRY_POINTS: Dict[str, object] = {}
 
+LEGOS_ROOT = Path(__file__).resolve().parent / "LEGOs"
+DEFAULT_CACHE_DIR = Path(".legos_cache")
+DEFAULT_CACHE_MAX_MB = 256
 
-def _load_legos_parser():
+
+def _load_legos_parser(entry_point: str = "parse_and_max_trace"):
     """
-    Import LEGOs' sleecParser lazily.
+    Import LEGOs' sleecParser lazily and return one of its entry points.
 
     This keeps `import legos_integration` working in environments that haven't
     installed LEGOs' heavier dependencies (e.g., pysmt), while still providing
     a clear error when the CLI is used without them.
     """
-    global _PARSE_AND_MAX_TRACE
-    if _PARSE_AND_MAX_TRACE is not None:
-        return _PARSE_AND_MAX_TRACE
+    if entry_point in _LEGOS_ENTRY_POINTS:
+        return _LEGOS_ENTRY_POINTS[entry_point]
 
     current_dir = os.path.dirname(os.path.abspath(__file__))
     if current_dir not in sys.path:
@@ -29,26 +41,112 @@ def _load_legos_parser():
         if path not in sys.path:
             sys.path.append(path)
 
-    _original_cwd = os.getcwd()
     try:
-        os.chdir(sleec_path)
+        from LEGOs.Sleec import sleecParser  # type: ignore
+    except ModuleNotFoundError as exc:
+        raise RuntimeError(
+            "LEGOs dependencies are not installed (missing module). "
+            "Use the provided conda/venv environment for LEGOs to run this script."
+        ) from exc
+
+    _LEGOS_ENTRY_POINTS[entry_point] = getattr(sleecParser, entry_point)
+    return _LEGOS_ENTRY_POINTS[entry_point]
+
+def _legos_source_version() -> str:
+    """Digest of the LEGOs sources that influence trace generation (analyzer, SLEEC front end, grammar)."""
+    digest = hashlib.sha256()
+    sources = sorted((LEGOS_ROOT / "Analyzer").glob("*.py")) + [
+        LEGOS_ROOT / "Sleec" / "sleecParser.py",
+        LEGOS_ROOT / "Sleec" / "sleec-gramar.tx",
+    ]
+    for source in sources:
+        digest.update(source.name.encode("utf-8"))
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def _legos_vol_bound() -> Optional[str]:
+    # Read from source so a cache hit never has to import LEGOs.
+    match = re.search(r"^VOL_BOUND\s*=\s*(\S+)", (LEGOS_ROOT / "Sleec" / "sleecParser.py").read_text(), re.M)
+    return match.group(1) if match else None
+
+
+def normalize_sleec_text(sleec_text: str) -> str:
+    """Drop comments, blank lines and whitespace differences that do not change the spec."""
+    lines = []
+    for line in sleec_text.splitlines():
+        line = line.split("//", 1)[0]
+        line = " ".join(line.split())
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+class TraceCache:
+    """
+    Content-addressed on-disk cache for LEGOs traces.
+
+    Entries are keyed by a hash of the normalized SLEEC text, the target rule IDs, the time
+    window, the trace format (text or jsonl), LEGOs' VOL_BOUND and the LEGOs source version,
+    so any input or solver change misses. The directory is bounded to `max_bytes` with least-recently-used eviction
+    (a hit refreshes the entry's mtime).
+    """
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._version = None
+
+    def key(self, sleec_file: str, rule_ids: Optional[List[str]], time_window: int, fmt: str = "text") -> str:
+        if self._version is None:
+            self._version = _legos_source_version()
+        payload = {
+            "sleec": normalize_sleec_text(Path(sleec_file).read_text(encoding="utf-8")),
+            "rules": sorted(set(rule_ids or [])),
+            "time_window": int(time_window),
+            "format": fmt,
+            "vol_bound": _legos_vol_bound(),
+            "legos": self._version,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.txt"
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entry(key)
         try:
-            from LEGOs.Sleec.sleecParser import parse_and_max_trace  # type: ignore
-        except ModuleNotFoundError as exc:
-            raise RuntimeError(
-                "LEGOs dependencies are not installed (missing module). "
-                "Use the provided conda/venv environment for LEGOs to run this script."
-            ) from exc
-    finally:
-        os.chdir(_original_cwd)
-
-    _PARSE_AND_MAX_TRACE = parse_and_max_trace
-    return _PARSE_AND_MAX_TRACE
+            text = entry.read_text(encoding="utf-8")
+            os.utime(entry)
+        except FileNotFoundError:
+            return None
+        return text
+
+    def put(self, key: str, trace_text: str) -> None:
+        write_atomic(self._entry(key), trace_text)
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for entry in self.cache_dir.glob("*.txt"):
+            with contextlib.suppress(FileNotFoundError):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                entry.unlink()
+            total -= size
+
 
 def run_sleec_parser(
     sleec_file: str,
     time_window: int = 600,
     rule_ids: Optional[List[str]] = None,
+    cache: Optional[TraceCache] = None,
+    records: Optional[List[Dict]] = None,
 ) -> str:
     """
     Run LEGOs' SLEEC parser to generate a raw trace string.
@@ -57,16 +155,40 @@ def run_sleec_parser(
         sleec_file: path of SLEEC file
         time_window: time window size (seconds)
         rule_ids: optional subset of rule IDs to target
+        cache: optional trace cache; a hit skips LEGOs entirely
+        records: optional list, extended with the typed trace records (see `write_trace_jsonl`)
         
     Returns:
         Raw trace string (lines like `at time X: Event()` and `Measure(...)`).
     """
     try:
         target_rules = rule_ids if rule_ids is not None else []
+        key = None
+        records_key = None
+        if cache is not None:
+            key = cache.key(sleec_file, target_rules, time_window)
+            cached = cache.get(key)
+            if records is not None:
+                records_key = cache.key(sleec_file, target_rules, time_window, fmt="jsonl")
+                cached_records = cache.get(records_key)
+                if cached_records is None:
+                    cached = None
+            if cached is not None:
+                print(f"[LEGOs] cache hit ({key[:12]})")
+                if records is not None:
+                    records.extend(parse_trace_jsonl(cached_records))
+                return cached
         parse_and_max_trace = _load_legos_parser()
-        output = parse_and_max_trace(sleec_file, target_rules, tracetime=time_window)
+        new_records = [] if records is not None else None
+        output = parse_and_max_trace(sleec_file, target_rules, tracetime=time_window, records=new_records)
         if not isinstance(output, str):
             raise TypeError(f"Expected trace string from LEGOs, got {type(output).__name__}")
+        if records is not None:
+            records.extend(new_records)
+        if cache is not None and output.strip():
+            cache.put(key, output)
+            if records_key is not None:
+                cache.put(records_key, format_trace_jsonl(new_records))
         return output
         
     except Exception as e:
@@ -74,10 +196,280 @@ def run_sleec_parser(
         return ""
 
 
+def run_sleec_sweep(
+    sleec_file: str,
+    time_windows: List[int],
+    rule_ids: Optional[List[str]] = None,
+    cache: Optional[TraceCache] = None,
+    records: Optional[Dict[int, List[Dict]]] = None,
+) -> Dict[int, str]:
+    """
+    Generate one raw trace per time window with a single LEGOs sweep.
+
+    The windows missing from the cache are solved smallest to largest on one solver
+    (`sweep_max_trigger_trace`) instead of one cold LEGOs run each. If `records` is given,
+    it is filled with the typed trace records of each window.
+
+    Returns:
+        Mapping of time window to raw trace string ("" when LEGOs found no trace).
+    """
+    target_rules = rule_ids if rule_ids is not None else []
+    traces = {}
+    keys = {}
+    records_keys = {}
+    for time_window in sorted(set(time_windows)):
+        if cache is not None:
+            keys[time_window] = cache.key(sleec_file, target_rules, time_window)
+            cached = cache.get(keys[time_window])
+            if records is not None:
+                records_keys[time_window] = cache.key(sleec_file, target_rules, time_window, fmt="jsonl")
+                cached_records = cache.get(records_keys[time_window])
+                if cached_records is None:
+                    cached = None
+            if cached is not None:
+                print(f"[LEGOs] t={time_window} cache hit ({keys[time_window][:12]})")
+                traces[time_window] = cached
+                if records is not None:
+                    records[time_window] = parse_trace_jsonl(cached_records)
+                continue
+        traces[time_window] = None
+
+    missing = [w for w, trace in traces.items() if trace is None]
+    if missing:
+        try:
+            parse_and_sweep_max_trace = _load_legos_parser("parse_and_sweep_max_trace")
+            results = parse_and_sweep_max_trace(sleec_file, target_rules, missing)
+        except Exception as e:
+            print(f"Error running LEGOS parser: {str(e)}")
+            results = []
+        for entry in results:
+            time_window = entry["time_window"]
+            output = entry["trace"] or ""
+            print(f"[LEGOs] t={time_window} {entry['status']} in {entry['seconds']:.2f}s")
+            if cache is not None and output.strip():
+                cache.put(keys[time_window], output)
+                if records is not None:
+                    cache.put(records_keys[time_window], format_trace_jsonl(entry["records"]))
+            traces[time_window] = output
+            if records is not None:
+                records[time_window] = entry["records"]
+    return {w: trace or "" for w, trace in traces.items()}
+
+
+def default_output_path(sleec_file: str, rule_ids: Optional[List[str]], time_window: int) -> Path:
+    """Default trace location: traces/<domain>_<rules>_<time>.txt."""
+    domain = Path(sleec_file).stem or Path(sleec_file).name
+    rule_part = "-".join(rule_ids) if rule_ids else "ALL"
+    return Path("traces") / f"{domain}_{rule_part}_{time_window}.txt"
+
+
+def format_trace_jsonl(records: List[Dict]) -> str:
+    """Render trace records as JSON lines, one action per line."""
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def parse_trace_jsonl(text: str) -> List[Dict]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def write_trace_jsonl(path: Path, records: List[Dict]) -> None:
+    """
+    Save a typed trace next to (or instead of) the text trace.
+
+    Each record is `{"time": int, "kind": str, "attributes": {...}, "present": bool}`, read from
+    the z3 model rather than re-parsed from `at time X: Event(...)` strings.
+    """
+    write_atomic(path, format_trace_jsonl(records))
+
+
+def iter_trace_records(path: Path, present_only: bool = True) -> Iterator[Dict]:
+    """Stream the records of a JSONL trace written by `write_trace_jsonl`, one line at a time."""
+    with Path(path).open(encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if present_only and not record.get("present", True):
+                continue
+            yield record
+
+
+def format_trace_record(record: Dict) -> str:
+    """Render a record the way LEGOs prints it, e.g. `at time 3: Measure(a=True, b=2)`."""
+    attrs = ", ".join(f"{name}={value}" for name, value in record["attributes"].items())
+    if record.get("time") is None:
+        return f"{record['kind']}({attrs})"
+    return f"at time {record['time']}: {record['kind']}({attrs})"
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Write `text` to `path` via a temp file in the same directory and an atomic rename."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+
+def load_manifest(manifest_path: Path, default_time_window: int) -> List[Dict]:
+    """
+    Read a batch manifest: a JSON array of jobs such as
+    `{"sleec": "domains/DAISY.sleec", "rules": ["Rule1"], "time_window": 600, "output": "..."}`.
+
+    Only `sleec` is required; `rules` defaults to ALL, `time_window` to the CLI value and
+    `output` to `default_output_path`.
+    """
+    try:
+        data = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except Exception as exc:  # noqa: BLE001
+        raise SystemExit(f"Failed to read batch manifest {manifest_path}: {exc}") from exc
+
+    if not isinstance(data, list):
+        raise SystemExit(f"Batch manifest {manifest_path} must contain a JSON array of jobs.")
+
+    jobs = []
+    for index, entry in enumerate(data):
+        if not isinstance(entry, dict) or "sleec" not in entry:
+            raise SystemExit(f"Batch job #{index} must be an object with at least a 'sleec' key.")
+        rules = entry.get("rules") or None
+        time_window = int(entry.get("time_window", default_time_window))
+        output = entry.get("output")
+        output_path = Path(output) if output else default_output_path(entry["sleec"], rules, time_window)
+        jobs.append(
+            {
+                "index": index,
+                "sleec": entry["sleec"],
+                "rules": rules,
+                "time_window": time_window,
+                "output": str(output_path),
+            }
+        )
+    return jobs
+
+
+def _run_batch_job(job: Dict, cache: Optional[TraceCache] = None, jsonl: bool = False) -> Dict:
+    """
+    Worker entry point for `run_batch`.
+
+    Each worker process runs exactly one job (see `maxtasksperchild` in `run_batch`), so the
+    module-level state LEGOs keeps between analyses never leaks from one job into the next.
+    """
+    result = dict(job)
+    start = time.perf_counter()
+    log = io.StringIO()
+    records = [] if jsonl else None
+    try:
+        with contextlib.redirect_stdout(log):
+            parse_and_max_trace = _load_legos_parser()
+            output = parse_and_max_trace(job["sleec"], job["rules"] or [], tracetime=job["time_window"],
+                                         records=records)
+        if not isinstance(output, str) or not output.strip():
+            result["status"] = "failed"
+            result["error"] = f"LEGOs returned no trace ({output!r})"
+        else:
+            write_atomic(Path(job["output"]), output)
+            if records is not None:
+                write_trace_jsonl(Path(job["output"]).with_suffix(".jsonl"), records)
+            if cache is not None and job.get("cache_key"):
+                cache.put(job["cache_key"], output)
+                if job.get("records_key"):
+                    cache.put(job["records_key"], format_trace_jsonl(records))
+            result["status"] = "ok"
+    except Exception as exc:  # noqa: BLE001
+        result["status"] = "error"
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["wall_time"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(
+    jobs: List[Dict], workers: Optional[int] = None, cache: Optional[TraceCache] = None, jsonl: bool = False
+) -> List[Dict]:
+    """
+    Fan `jobs` out over a pool of worker processes and return their results in manifest order.
+
+    Workers are started with the `spawn` method and retired after a single job, which gives each
+    job a fresh interpreter with clean LEGOs globals. Cache hits are served in the parent
+    without starting a worker. With `jsonl`, every job also saves its typed trace records next to
+    its text trace (.jsonl).
+    """
+    if not jobs:
+        return []
+    results = []
+    pending = []
+    for job in jobs:
+        if cache is None:
+            pending.append(job)
+            continue
+        start = time.perf_counter()
+        try:
+            job = dict(job, cache_key=cache.key(job["sleec"], job["rules"], job["time_window"]))
+            if jsonl:
+                job["records_key"] = cache.key(job["sleec"], job["rules"], job["time_window"], fmt="jsonl")
+        except Exception as exc:  # noqa: BLE001
+            # an unreadable spec fails its own job, not the batch
+            result = dict(job, status="error", error=f"{type(exc).__name__}: {exc}",
+                          wall_time=round(time.perf_counter() - start, 3))
+            print(f"[LEGOs] job #{result['index']} error -> {result['output']}")
+            print(f"[LEGOs]   {result['error']}")
+            results.append(result)
+            continue
+        cached = cache.get(job["cache_key"])
+        cached_records = cache.get(job["records_key"]) if jsonl else None
+        if cached is None or (jsonl and cached_records is None):
+            pending.append(job)
+            continue
+        write_atomic(Path(job["output"]), cached)
+        if jsonl:
+            write_atomic(Path(job["output"]).with_suffix(".jsonl"), cached_records)
+        result = dict(job, status="ok", cached=True, wall_time=round(time.perf_counter() - start, 3))
+        print(f"[LEGOs] job #{result['index']} cached -> {result['output']}")
+        results.append(result)
+
+    if not pending:
+        results.sort(key=lambda r: r["index"])
+        return results
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes=workers, maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(functools.partial(_run_batch_job, cache=cache, jsonl=jsonl), pending):
+            status = result["status"]
+            print(f"[LEGOs] job #{result['index']} {status} in {result['wall_time']:.2f}s -> {result['output']}")
+            if status != "ok":
+                print(f"[LEGOs]   {result.get('error', '')}")
+            results.append(result)
+    results.sort(key=lambda r: r["index"])
+    return results
+
+
+def _print_batch_summary(results: List[Dict], total_time: float) -> None:
+    print(f"[LEGOs] Batch summary ({len(results)} jobs, {total_time:.2f}s wall):")
+    for r in results:
+        rule_part = " ".join(r["rules"]) if r["rules"] else "ALL"
+        print(f"  #{r['index']:<3} {r['status']:<6} {r['wall_time']:>8.2f}s  "
+              f"{r['sleec']} [{rule_part}] t={r['time_window']}{' (cached)' if r.get('cached') else ''}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate raw traces from SLEEC files using LEGOs.")
-    parser.add_argument("--sleec", required=True, help="Path to the SLEEC file (e.g., examples/DAISY.sleec).")
+    parser.add_argument("--sleec", help="Path to the SLEEC file (e.g., examples/DAISY.sleec).")
     parser.add_argument("--time-window", type=int, default=15, help="Trace time window (default: 15).")
+    parser.add_argument(
+        "--time-windows",
+        type=int,
+        nargs="+",
+        help=(
+            "Several trace time windows for --sleec, solved in one incremental LEGOs sweep; "
+            "each trace is saved to traces/<domain>_<rules>_<time>.txt."
+        ),
+    )
     parser.add_argument(
         "--rules",
         nargs="+",
@@ -91,23 +483,103 @@ def main():
             "Note: LEGOs may also save its own copy under traces/."
         ),
     )
+    parser.add_argument(
+        "--batch",
+        type=Path,
+        help=(
+            "JSON manifest of jobs ({sleec, rules, time_window, output}) to run over a process pool "
+            "instead of a single --sleec run."
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes for --batch (default: number of CPUs).",
+    )
+    parser.add_argument(
+        "--summary",
+        type=Path,
+        default=Path("traces") / "batch_summary.json",
+        help="Where to write the per-job summary for --batch (default: traces/batch_summary.json).",
+    )
+    parser.add_argument(
+        "--jsonl",
+        action="store_true",
+        help=(
+            "Also save the trace as typed JSON lines (one record per action) next to the text trace (.jsonl), "
+            "for every job with --batch."
+        ),
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Always re-run LEGOs instead of reusing cached traces.")
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory of the content-addressed trace cache (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_CACHE_MAX_MB,
+        help=f"Size bound of the trace cache in MB; least recently used traces are evicted (default: {DEFAULT_CACHE_MAX_MB}).",
+    )
     args = parser.parse_args()
+    cache = None if args.no_cache else TraceCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+
+    if args.batch:
+        if args.time_windows:
+            parser.error("--time-windows cannot be combined with --batch; give each job its own time_window")
+        jobs = load_manifest(args.batch, args.time_window)
+        print(f"[LEGOs] Running {len(jobs)} batch jobs from {args.batch}...")
+        start = time.perf_counter()
+        results = run_batch(jobs, args.workers, cache, args.jsonl)
+        total_time = time.perf_counter() - start
+        _print_batch_summary(results, total_time)
+        write_atomic(args.summary, json.dumps({"total_wall_time": round(total_time, 3), "jobs": results}, indent=2))
+        print(f"[LEGOs] Batch summary saved to {args.summary}")
+        if any(r["status"] != "ok" for r in results):
+            raise SystemExit("Some batch jobs failed to generate a trace.")
+        return
+
+    if not args.sleec:
+        parser.error("--sleec is required unless --batch is given")
+
+    if args.time_windows:
+        if args.output:
+            parser.error("--output cannot be combined with --time-windows")
+        print(f"[LEGOs] Sweeping {args.sleec} over time windows {sorted(set(args.time_windows))}...")
+        records = {} if args.jsonl else None
+        traces = run_sleec_sweep(args.sleec, args.time_windows, args.rules, cache, records)
+        for time_window, trace_text in traces.items():
+            if not trace_text.strip():
+                print(f"[LEGOs] LEGOs returned an empty trace for time window {time_window}")
+                continue
+            output_path = default_output_path(args.sleec, args.rules, time_window)
+            write_atomic(output_path, trace_text)
+            print(f"[LEGOs] Trace saved to {output_path}")
+            if records is not None:
+                write_trace_jsonl(output_path.with_suffix(".jsonl"), records.get(time_window, []))
+                print(f"[LEGOs] Trace records saved to {output_path.with_suffix('.jsonl')}")
+        if not any(trace_text.strip() for trace_text in traces.values()):
+            raise SystemExit("Failed to generate trace via LEGOs parser.")
+        return
 
     print(f"[LEGOs] Generating trace for {args.sleec} (time window={args.time_window})...")
-    trace_text = run_sleec_parser(args.sleec, args.time_window, args.rules)
+    records = [] if args.jsonl else None
+    trace_text = run_sleec_parser(args.sleec, args.time_window, args.rules, cache, records)
     if not trace_text.strip():
         raise SystemExit("Failed to generate trace via LEGOs parser.")
 
     output_path = args.output
     if output_path is None:
-        domain = Path(args.sleec).stem or Path(args.sleec).name
-        rule_part = "-".join(args.rules) if args.rules else "ALL"
-        output_path = Path("traces") / f"{domain}_{rule_part}_{args.time_window}.txt"
+        output_path = default_output_path(args.sleec, args.rules, args.time_window)
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(trace_text, encoding="utf-8")
+    write_atomic(output_path, trace_text)
 
     print(f"[LEGOs] Trace saved to {output_path}")
+    if records is not None:
+        write_trace_jsonl(output_path.with_suffix(".jsonl"), records)
+        print(f"[LEGOs] Trace records saved to {output_path.with_suffix('.jsonl')}")
 
 
 if __name__ == "__main__":
@@ -3,7 +3,7 @@
 Single-file augmentation runner.
 
 Inputs:
-  - A trace text file (e.g., generated by legos_integration.py)
+  - A trace text file or JSONL trace records (e.g., generated by legos_integration.py)
   - A JSON array from extract_context.py (system_agent/interacting_agent/user/location/time entries)
 
 Behaviour:
@@ -26,6 +26,8 @@ from typing import Dict, List, Optional
 
 from openai import OpenAI
 
+from legos_integration import format_trace_record, iter_trace_records
+
 
 # ------------------------------
 # Models / configuration
@@ -391,7 +393,11 @@ TIME_REGEX = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)(?::([0-5]\d))?\b")
 
 def _parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Augment a trace using extracted measure domain cues.")
-    parser.add_argument("input", type=Path, help="Path to the input trace file.")
+    parser.add_argument(
+        "input",
+        type=Path,
+        help="Path to the input trace file (text, or .jsonl records from legos_integration.py --jsonl).",
+    )
     parser.add_argument(
         "--measure-domain",
         type=Path,
@@ -464,6 +470,21 @@ def _parse_trace_lines(trace_text: str) -> List[tuple]:
     return lines
 
 
+def _load_trace_records(path: Path) -> tuple[str, List[tuple]]:
+    """Read a JSONL trace (legos_integration.py --jsonl) into the prompt text and trace tuples."""
+    text_lines: List[str] = []
+    lines: List[tuple] = []
+    for record in iter_trace_records(path):
+        if record.get("time") is None:
+            continue
+        rendered = format_trace_record(record)
+        text_lines.append(rendered)
+        lines.append((record["time"], rendered.split(": ", 1)[1], record["kind"] == "Measure"))
+    if not text_lines:
+        raise ValueError(f"Input file '{path}' is empty.")
+    return "\n".join(text_lines), lines
+
+
 def main() -> None:
     args = _parse_args()
 
@@ -471,8 +492,11 @@ def main() -> None:
     start_clocks = _derive_start_clocks(domain_measures)
     config = AugmentationConfig(domain_measures=domain_measures, start_clocks=start_clocks)
 
-    trace_text = load_input(args.input)
-    trace_lines = _parse_trace_lines(trace_text)
+    if args.input.suffix == ".jsonl":
+        trace_text, trace_lines = _load_trace_records(args.input)
+    else:
+        trace_text = load_input(args.input)
+        trace_lines = _parse_trace_lines(trace_text)
     if not trace_lines:
         raise SystemExit("Input trace must contain lines like 'at time X: <event>'.")
     prompt = build_prompt(trace_text, config)